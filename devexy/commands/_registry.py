@@ -0,0 +1,7 @@
+# Top-level command names and the modules that define their Typer apps
+COMMANDS = {
+  "logs": "devexy.commands.logs",
+  "mk": "devexy.commands.minikube",
+  "version": "devexy.commands.version",
+  "workon": "devexy.commands.workon",
+}
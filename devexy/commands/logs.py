@@ -8,12 +8,18 @@ from devexy.utils.logging import LOG_FILE
 
 app = typer.Typer()
 
+# Longest the follower sleeps between checks once the log file has gone quiet
+MAX_FOLLOW_INTERVAL = 1.0
+FOLLOW_READ_SIZE = 64 * 1024
+
 
 @app.command()
 def logs(
   lines: int = typer.Option(20, help="Number of lines to display."),
   follow: bool = typer.Option(False, "--follow", "-f", help="Follow the log file."),
-  update_interval: float = typer.Option(0.1, help="Update interval in seconds."),
+  update_interval: float = typer.Option(
+    0.1, help="Update interval in seconds while the log is active."
+  ),
 ):
   """
   Display the last N lines of the log file, or follow the log file.
@@ -33,14 +39,29 @@ def logs(
 
       signal.signal(signal.SIGINT, signal_handler)
 
-      with open(LOG_FILE, "r") as f:
-        f.seek(0, os.SEEK_END)
+      fd = os.open(LOG_FILE, os.O_RDONLY)
+      try:
+        os.lseek(fd, 0, os.SEEK_END)
+        pending = b""
+        interval = update_interval
         while not stop_flag:
-          line = f.readline()
-          if line:
-            typer.echo(line.strip())
-            line_count += 1
-          time.sleep(update_interval)
+          chunk = os.read(fd, FOLLOW_READ_SIZE)
+          if not chunk:
+            # Back off while idle so a quiet log doesn't keep waking us up
+            interval = min(interval * 2, max(update_interval, MAX_FOLLOW_INTERVAL))
+            time.sleep(interval)
+            continue
+
+          # Hold back a trailing partial line until the rest of it is written
+          *new_lines, pending = (pending + chunk).split(b"\n")
+          if new_lines:
+            typer.echo(b"".join(line.strip() + b"\n" for line in new_lines), nl=False)
+            line_count += len(new_lines)
+          interval = update_interval
+          if len(chunk) < FOLLOW_READ_SIZE:
+            time.sleep(interval)
+      finally:
+        os.close(fd)
     except FileNotFoundError:
       typer.echo(f"Log file not found: {LOG_FILE}", err=True)
     except Exception as e:
@@ -1,13 +1,12 @@
+import os
+import sys
 import threading
-import time
-from os import sep
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from turtle import st
-from typing import Iterator, List
 
 import typer
 import yaml
-from blessed import Terminal
 
 from devexy import settings
 from devexy.exceptions import ToolError
@@ -16,8 +15,10 @@ from devexy.k8s.utils import (
   SCALABLE_KINDS,
   clear_cache,
   get_key,
+  get_last_applied_annotation,
   get_last_applied_configuration,
   get_replicas,
+  parse_last_applied_configuration,
   yaml_to_dicts,
 )
 from devexy.settings import KUSTOMIZE_OVERLAY_DIR, KUSTOMIZE_ROOT
@@ -28,7 +29,20 @@ from devexy.utils.logging import get_logger
 
 logger = get_logger(__name__)
 app = typer.Typer()
-term = Terminal()
+
+DEFAULT_JOBS = min(32, (os.cpu_count() or 1) * 4)
+INPUT_POLL_INTERVAL = 0.25
+# Order in which kinds are applied when resources can't be applied as one batch
+APPLY_TIERS = {
+  "namespace": 0,
+  "customresourcedefinition": 1,
+  "configmap": 2,
+  "secret": 2,
+  "deployment": 4,
+  "statefulset": 4,
+  "replicaset": 4,
+}
+DEFAULT_APPLY_TIER = 3
 
 
 class ClusterTable:
@@ -45,11 +59,24 @@ class ClusterTable:
     return self.resources[self.selected_index]
 
   def __init__(self, resources):
+    # blessed is only needed by the table, so keep it out of CLI startup
+    from blessed import Terminal
+
+    self.term = Terminal()
+    self._row_template = "|".join(f"{{:^{x[1]}}}" for x in self.columns)
+    self._header = self._styled_header()
+    self._separator = self._styled_separator()
+    self._footer = self._styled_footer()
     self.resources = [*resources]
     self.row_count = len(resources)
     self.selected_index = 0
     self.running = True
     self.input_thread = None
+    # Set whenever the table needs repainting
+    self._dirty = threading.Event()
+    self._dirty.set()
+    for res in self.resources:
+      res.on_change = lambda _: self._dirty.set()
 
   @staticmethod
   def get_status(res: Resource):
@@ -80,32 +107,44 @@ class ClusterTable:
 
     return "unknown"
 
+  def _styled_header(self):
+    header = self._row_template.format(*(x[0] for x in self.columns))
+    return self.term.bold(self.term.white(header))
+
+  def _styled_separator(self):
+    separator = "|".join("-" * x[1] for x in self.columns)
+    return self.term.bold(self.term.white(separator))
+
+  def _styled_footer(self):
+    term = self.term
+    footer = "[↑/↓] Move  [s] Start/Stop  [m] Remote/Local Mode  [q] Quit"
+    return term.move_xy(0, term.height - 1) + term.center(term.bold(term.cyan(footer)))
+
   def render_table(self):
-    row_template = "|".join(f"{{:^{x[1]}}}" for x in self.columns)
+    term = self.term
+    row_template = self._row_template
 
     def _clear_terminal():
       print(term.home + term.clear)
 
     def _render_header():
-      header = row_template.format(*(x[0] for x in self.columns))
-      print(term.bold(term.white(header)))
+      print(self._header)
 
     def _render_separator():
-      separator = "|".join("-" * x[1] for x in self.columns)
-      print(term.bold(term.white(separator)))
+      print(self._separator)
 
     def _render_footer():
-      footer = "[↑/↓] Move  [s] Start/Stop  [m] Remote/Local Mode  [q] Quit"
-      print(
-        term.move_xy(0, term.height - 1) + term.center(term.bold(term.cyan(footer))),
-        end="",
-        flush=True,
-      )
+      print(self._footer, end="", flush=True)
 
     def _render_rows():
-      for i, resource in enumerate(self.resources):
-        row_values = _get_row_values(resource)
-        _render_row(i, row_values)
+      # Batch the changed rows into one write, rather than one per row
+      frame = "".join(
+        _render_row(i, _get_row_values(resource))
+        for i, resource in enumerate(self.resources)
+      )
+      if frame:
+        sys.stdout.write(frame)
+        sys.stdout.flush()
 
     def _get_row_values(res: Resource):
       local_port = res.local_port or "undefined"
@@ -119,13 +158,19 @@ class ClusterTable:
         status,
       )
 
+    # Last text drawn on each row, so unchanged rows aren't written again
+    rendered_rows = {}
+
     def _render_row(i, row_values):
       row = row_template.format(*row_values)
 
       if i == self.selected_index:
         row = term.reverse(row)
 
-      print(term.move_xy(0, 3 + i) + row)
+      if rendered_rows.get(i) == row:
+        return ""
+      rendered_rows[i] = row
+      return term.move_xy(0, 3 + i) + row
 
     with term.fullscreen(), term.cbreak(), term.hidden_cursor():
       _clear_terminal()
@@ -133,13 +178,21 @@ class ClusterTable:
       _render_separator()
       _render_footer()
 
-      while self.running:
-        _render_rows()
-        time.sleep(0.05)
+      try:
+        while self.running:
+          self._dirty.wait(timeout=1.0)
+          self._dirty.clear()
+          _render_rows()
+      finally:
+        # Lets the input thread exit if rendering stopped for any other reason
+        self.running = False
 
   def handle_input(self):
+    term = self.term
     while self.running:
-      key = term.inkey()
+      # Block in the kernel until a key arrives, but wake now and then to notice
+      # the table shutting down
+      key = term.inkey(timeout=INPUT_POLL_INTERVAL)
       if not key:
         continue
 
@@ -161,6 +214,8 @@ class ClusterTable:
       elif key == "q":
         self.running = False
 
+      self._dirty.set()
+
   def run(self):
     self.input_thread = threading.Thread(target=self.handle_input, daemon=True)
     self.input_thread.start()
@@ -174,6 +229,11 @@ def workon(
     False,
     help="Apply the current YAML sate to the cluster.",
   ),
+  jobs: int = typer.Option(
+    DEFAULT_JOBS,
+    min=1,
+    help="Maximum number of concurrent kubectl queries when applying.",
+  ),
 ):
   """Forward ports between localhost and the cluster, or vice-versa."""
   if apply:
@@ -181,26 +241,23 @@ def workon(
       print("")  # dumb hack to make the message appear
       clear_cache()
       ok()
-    apply_cluster_config()
+    apply_cluster_config(jobs=jobs)
 
-  namespaces = kubectl.get_namespaces()
   scalable_resources = []
 
   with begin("querying cluster for scalable resources"):
-    for namespace in namespaces:
-      for kind in SCALABLE_KINDS:
-        try:
-          docs = kubectl.get_resource_docs(kind=kind, namespace=namespace)
-          for doc in docs:
-            last_applied = get_last_applied_configuration(doc)
-            if last_applied:
-              scalable_resources.append(Resource(last_applied))
-            else:
-              logger.warning(
-                f"resource {get_key(doc)} has no last applied configuration."
-              )
-        except Exception as e:
-          fail(f"failed while querying {kind} resources: {e}")
+    # One listing across every namespace covers all the scalable kinds
+    kinds = ",".join(sorted(SCALABLE_KINDS))
+    try:
+      docs = kubectl.get_resource_docs(kind=kinds, namespace=None, cached=True)
+    except Exception as e:
+      fail(f"failed while querying {kinds} resources: {e}")
+    for doc in docs:
+      last_applied = get_last_applied_configuration(doc)
+      if last_applied:
+        scalable_resources.append(Resource(last_applied))
+      else:
+        logger.warning(f"resource {get_key(doc)} has no last applied configuration.")
     scalable_count = len(scalable_resources)
     if scalable_count:
       ok(f"found {scalable_count} scalable resources")
@@ -226,32 +283,128 @@ def ensure_namespaces(resources: list[Resource]):
     return
 
   with begin("checking namespaces"):
+    try:
+      existing = set(kubectl.get_namespaces())
+    except RuntimeError as e:
+      logger.warning(f"failed to list namespaces: {e}")
+      existing = set()
+
     for namespace in namespaces:
-      kubectl.create_namespace_if_not_exists(namespace)
+      if namespace not in existing:
+        kubectl.create_namespace_if_not_exists(namespace)
       ok(namespace)
 
 
-def _iter_resources(yaml_content: str) -> Iterator[Resource]:
-  for doc in yaml_to_dicts(yaml_content):
+def _iter_resources(content: str | list[dict]) -> Iterator[Resource]:
+  docs = yaml_to_dicts(content) if isinstance(content, str) else content
+  for doc in docs:
     yield Resource(doc)
 
 
-def _set_initial_replicas(res: Resource):
-  if res.is_scalable:
-    last_applied = kubectl.get_last_applied_doc(
+def _fetch_last_applied_docs(
+  resources: list[Resource],
+  jobs: int,
+) -> dict[str, str | None]:
+  """Fetches the last applied configurations of the resources from the cluster, by
+  key, as stored by kubectl (unparsed).
+  A single batched query covering every kind is tried first. If that fails, only
+  scalable resources are looked up, concurrently, as their replicas are needed.
+  Resources whose lookup failed are left out.
+  """
+  last_applied_docs = {}
+  if not resources:
+    return last_applied_docs
+
+  try:
+    kinds = sorted({res.kind.lower() for res in resources})
+    cluster_docs = kubectl.get_last_applied_docs(kinds, raw=True)
+    return {res.key: cluster_docs.get(res.key) for res in resources}
+  except RuntimeError as e:
+    logger.warning(f"batched last applied config lookup failed: {e}")
+
+  scalable_resources = [res for res in resources if res.is_scalable]
+  if not scalable_resources:
+    return last_applied_docs
+
+  def _fetch(res: Resource):
+    doc = kubectl.get_current_state(
       kind=res.kind,
       name=res.name,
       namespace=res.namespace,
     )
+    return get_last_applied_annotation(doc) if doc else None
+
+  with ThreadPoolExecutor(max_workers=jobs) as executor:
+    futures = {res.key: executor.submit(_fetch, res) for res in scalable_resources}
+    for key, future in futures.items():
+      try:
+        last_applied_docs[key] = future.result()
+      except Exception as e:
+        logger.exception(f"error getting last applied config for {key}: {e}")
+
+  return last_applied_docs
+
+
+def _apply_each(resources: list[Resource], jobs: int) -> list[bool | None]:
+  """Applies resources individually, returning the result of each.
+  Tiers are applied in order so dependencies exist first; the resources within a
+  tier are applied concurrently.
+  """
+  tiers: dict[int, list[Resource]] = {}
+  for res in resources:
+    tier = APPLY_TIERS.get(res.kind.lower(), DEFAULT_APPLY_TIER)
+    tiers.setdefault(tier, []).append(res)
+
+  results = []
+  with ThreadPoolExecutor(max_workers=jobs) as executor:
+    for tier in sorted(tiers):
+      results.extend(executor.map(Resource.apply, tiers[tier]))
+  return results
+
+
+def _apply_batches(resources: list[Resource], jobs: int) -> list[bool | None]:
+  """Applies resources with one kubectl call per tier and namespace, returning the
+  result of each. kubectl reports results without the namespace, so resources are
+  only batched with others from the same namespace.
+  Tiers are applied in order so dependencies exist first.
+  """
+  batches: dict[tuple[int, str], list[Resource]] = {}
+  for res in resources:
+    tier = APPLY_TIERS.get(res.kind.lower(), DEFAULT_APPLY_TIER)
+    batches.setdefault((tier, res.namespace), []).append(res)
+
+  results = []
+  # Sorting is stable, so namespaces keep the order they were received in
+  for batch_key in sorted(batches, key=lambda batch_key: batch_key[0]):
+    batch = batches[batch_key]
+    try:
+      applied = kubectl.apply_many([res.yaml for res in batch])
+    except ToolError as e:
+      # Apply one at a time, so a single bad resource doesn't hide the rest
+      logger.warning(f"batched apply failed, applying individually: {e.stderr}")
+      results.extend(_apply_each(batch, jobs))
+      continue
+
+    for res in batch:
+      # Resources kubectl didn't report on count as skipped
+      result = applied.get(res.apply_name)
+      if result is not None:
+        res.mark_applied()
+      results.append(result)
+  return results
+
+
+def _set_initial_replicas(res: Resource, last_applied: dict | None):
+  if res.is_scalable:
     res.set_replicas(get_replicas(last_applied) if last_applied else 0)
 
 
-def apply_cluster_config():
+def apply_cluster_config(jobs: int = DEFAULT_JOBS):
   """Builds cluster config via Kustomize and applies via kubectl.
   Scalable resources will be set to 0 replicas when deployed for the first time.
   Unchanged resources will not be re-deployed.
   """
-  resources: List[Resource] = []
+  resources: list[Resource] = []
   changed_count = 0
   skipped_count = 0
   unchanged_count = 0
@@ -271,9 +424,9 @@ def apply_cluster_config():
 
   try:
     with begin("loading cluster configuration"):
-      yaml_output = kustomize.build(overlay_path)
+      docs = kustomize.build_docs(overlay_path)
       # Resources will be grouped according to dependencies, so process in receive order
-      for resource in _iter_resources(yaml_output):
+      for resource in _iter_resources(docs):
         resources.append(resource)
       ok(f"{len(resources)} resources found")
   except ToolError as e:
@@ -286,13 +439,26 @@ def apply_cluster_config():
   ensure_namespaces(resources)
 
   with begin("applying configuration"):
+    last_applied_docs = _fetch_last_applied_docs(resources, jobs)
+    pending: list[Resource] = []
     for resource in resources:
-      try:
-        _set_initial_replicas(resource)
-      except Exception as e:
-        logger.exception(f"error setting replicas for {resource.key}: {e}")
-
-      result = resource.apply()
+      if resource.key in last_applied_docs:
+        raw_last_applied = last_applied_docs[resource.key]
+        # Only scalable resources need the parsed doc, for their replicas
+        last_applied = None
+        if raw_last_applied is not None and resource.is_scalable:
+          last_applied = parse_last_applied_configuration(raw_last_applied)
+        _set_initial_replicas(resource, last_applied)
+
+        # Matching the server's copy means an apply would be a no-op
+        if raw_last_applied is not None and resource.matches_last_applied(
+          raw_last_applied, last_applied
+        ):
+          unchanged_count += 1
+          continue
+      pending.append(resource)
+
+    for result in _apply_batches(pending, jobs):
       if result is None:
         skipped_count += 1
       elif result:
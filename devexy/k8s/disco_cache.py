@@ -0,0 +1,36 @@
+import time
+from pathlib import Path
+
+from devexy.settings import APP_DIR
+from devexy.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Kept apart from the state cache, so clearing state (as `workon --apply` does)
+# doesn't throw away what was discovered about the cluster's API
+DISCO_CACHE_ROOT = APP_DIR / "disco_cache"
+
+
+def cache_file(key: str, ttl: float) -> Path:
+  """Returns the file to cache the discovery results for `key` in, first removing
+  the cached copy if it is older than `ttl` seconds.
+
+  Like kubectl's discovery cache, this is meant for slow-changing cluster facts,
+  such as the resources an API server offers, that would otherwise be fetched on
+  every invocation.
+  """
+  path = DISCO_CACHE_ROOT / f"{key}.json"
+  try:
+    if path.stat().st_mtime + ttl <= time.time():
+      logger.debug("Discovery cache expired: %s", path)
+      path.unlink(missing_ok=True)
+  except FileNotFoundError:
+    pass
+  except OSError as e:
+    logger.warning("Ignoring unreadable discovery cache %s: %s", path, e)
+
+  try:
+    path.parent.mkdir(parents=True, exist_ok=True)
+  except OSError as e:
+    logger.warning("Failed to create discovery cache directory %s: %s", path, e)
+  return path
@@ -1,54 +1,100 @@
-import atexit
-import copy
 import datetime
 import functools
-import json
-import random
-import subprocess
-import threading
 import time
-from pathlib import Path
+from collections.abc import Callable
 from typing import Any
 
 from devexy.constants import K8S_REVERSE_PROXY_CONTAINER_NAME
+from devexy.k8s.state_store import state_store
 from devexy.k8s.utils import (
-  SCALABLE_KINDS,
-  STATE_CACHE_ROOT,
   dict_to_yaml,
+  format_key,
   get_first_container,
-  get_key,
   get_kind,
   get_local_port,
   get_name,
   get_namespace,
   get_replicas,
   get_reverse_proxy_container,
+  is_scalable_kind,
+  parse_last_applied_configuration,
 )
+from devexy.k8s.watcher import state_watcher
 from devexy.tools.kubectl import kubectl
+from devexy.tools.port_forward_manager import port_forward_manager
+from devexy.utils.copying import fast_dict_copy
 from devexy.utils.logging import get_logger
 from devexy.utils.safe_dict import SafeDict
 from devexy.utils.text import quick_hash
-from devexy.utils.threading import cleanup
 
 logger = get_logger(__name__)
 
+FORWARDING_POLL_INTERVAL = 0.5
+
+# Marks a cached value that hasn't been computed yet, when None is a valid result
+_UNSET = object()
+
+_WORKLOAD_PORTS = (
+  ("spec", "template", "spec", "containers", "*", "ports"),
+  "containerPort",
+)
+# Where each kind lists its ports, and the key holding the port number
+_PORT_PATHS = {
+  "pod": (("spec", "containers", "*", "ports"), "containerPort"),
+  "deployment": _WORKLOAD_PORTS,
+  "statefulset": _WORKLOAD_PORTS,
+  "replicaset": _WORKLOAD_PORTS,
+  "service": (("spec", "ports"), "port"),
+}
+
+
+def _iter_path(value, path):
+  """Yields the values found at `path`, where "*" matches every item of a list."""
+  if not path:
+    yield value
+    return
+  head, *rest = path
+  if head == "*":
+    for item in value or []:
+      yield from _iter_path(item, rest)
+  elif isinstance(value, dict):
+    yield from _iter_path(value.get(head), rest)
+
 
 class Resource:
-  _monitor_thread: threading.Thread = None
-  _forwarding_thread: threading.Thread = None
-  _forwarding_process: subprocess.Popen = None
+  # The state last written to the cache
+  _dumped_state: dict = None
+  _forwarding_active = False
+  _forwarding_polled_at = float("-inf")
+  # Called with the resource whenever the watcher observes a change in its state
+  on_change: Callable[["Resource"], None] = None
 
   def __init__(self, doc: dict):
     self._original_doc = doc
-    self._doc = copy.deepcopy(doc)
+    self._doc = fast_dict_copy(doc)
+    # Derived from _doc; cleared by _invalidate() whenever _doc changes
+    self._yaml_cache: str = None
+    self._hash_cache: str = None
+    self._target_port_cache = _UNSET
 
-    self._k8s_state = SafeDict()
-    try:
-      loaded_state = self._load_k8s_state()
-      self._k8s_state.update(loaded_state)
-    except Exception as e:
-      logger.warning("Failed to load state cache: %s", e, exc_info=True)
-    self._k8s_state["key"] = self.key
+    # Loaded on first use, as many resources never need their cached state
+    self._state: SafeDict = None
+
+  @property
+  def _k8s_state(self) -> SafeDict:
+    if self._state is None:
+      state = SafeDict()
+      try:
+        state.update(self._load_k8s_state())
+      except Exception as e:
+        logger.warning("Failed to load state cache: %s", e, exc_info=True)
+      state["key"] = self.key
+      self._state = state
+    return self._state
+
+  @_k8s_state.setter
+  def _k8s_state(self, state: dict):
+    self._state = state if isinstance(state, SafeDict) else SafeDict(state)
 
   def __str__(self):
     return self.name
@@ -70,15 +116,23 @@ class Resource:
 
   @functools.cached_property
   def key(self):
-    return get_key(self._doc)
+    return format_key(self.namespace, self.kind, self.name)
+
+  @functools.cached_property
+  def apply_name(self):
+    """The name `kubectl apply` reports the resource by, e.g. deployment.apps/web.
+    It leaves out the namespace, so it is only unique within one."""
+    group = self._doc.get("apiVersion", "").rpartition("/")[0]
+    kind = f"{self.kind.lower()}.{group}" if group else self.kind.lower()
+    return f"{kind}/{self.name}"
 
   @functools.cached_property
   def is_scalable(self):
-    return self.kind.lower() in SCALABLE_KINDS
+    return is_scalable_kind(self.kind)
 
   @property
   def is_monitoring(self):
-    return self._monitor_thread is not None
+    return state_watcher.is_watching(self)
 
   @property
   def is_proxying(self):
@@ -102,158 +156,154 @@ class Resource:
     if "spec" not in self._doc:
       self._doc["spec"] = {}
     self._doc["spec"]["replicas"] = replicas
+    self._invalidate()
     if apply:
       self.apply()
 
+  def matches(self, doc: dict) -> bool:
+    """Whether applying this resource would produce `doc`."""
+    return self._doc == doc
+
+  def matches_last_applied(self, last_applied: str, parsed: dict | None = None) -> bool:
+    """Whether applying this resource would reproduce a last applied configuration,
+    given as stored by kubectl. kubectl writes compact JSON with sorted keys, like
+    `yaml`, so the text usually settles it without parsing. `parsed` may be passed
+    if it was already parsed.
+    """
+    if last_applied.rstrip("\n") == self.yaml:
+      return True
+    if parsed is None:
+      parsed = parse_last_applied_configuration(last_applied)
+    return parsed is not None and self.matches(parsed)
+
   @property
   def yaml(self):
-    return dict_to_yaml(self._doc)
+    if self._yaml_cache is None:
+      self._yaml_cache = dict_to_yaml(self._doc)
+    return self._yaml_cache
+
+  @property
+  def state_hash(self):
+    """Hash of the content that would be applied."""
+    if self._hash_cache is None:
+      self._hash_cache = quick_hash(self.yaml)
+    return self._hash_cache
+
+  def _invalidate(self):
+    """Must be called after any change to `_doc`."""
+    self._yaml_cache = None
+    self._hash_cache = None
+    self._target_port_cache = _UNSET
 
   @functools.cached_property
   def key_hash(self):
     return quick_hash(self.key)
 
-  @functools.cached_property
-  def _k8s_state_file_name(self) -> Path:
-    filename = f"{self.key_hash}.json"
-    return filename
-
-  @functools.cached_property
-  def _k8s_state_file_path(self) -> Path:
-    filepath = STATE_CACHE_ROOT / self._k8s_state_file_name
-    return filepath
-
   def _load_k8s_state(self):
-    state_file = self._k8s_state_file_path
-
-    if not state_file.exists():
-      logger.debug("Cache file for %s does not exist: %s", self.key, state_file)
-      return {}
-
-    with open(state_file, "r") as f:
-      content = f.read()
-      if content:
-        state = json.loads(content)
-        logger.info("Loaded state cache for %s from %s", self.key, state_file)
-        logger.debug("State for %s: %s", self.key, state)
-        return state
-      else:
-        logger.debug("Cache file for %s is empty: %s", self.key, state_file)
-        return {}
+    state = state_store.get(self.key_hash)
+    logger.debug("Loaded state for %s: %s", self.key, state)
+    return state
 
   def _set_state(self, key: str, value: Any, commit=True):
-    self._k8s_state[key] = value
+    with self._k8s_state.transaction() as state:
+      state[key] = value
     logger.debug("Set key '%s' in state to %s for %s", key, value, self.key)
     if commit:
       self._dump_k8s_state()
 
   def _del_state(self, key: str):
-    if key in self._k8s_state:
-      del self._k8s_state[key]
-      logger.debug("Removed key '%s' from state for %s", key, self.key)
-      self._dump_k8s_state()
+    with self._k8s_state.transaction() as state:
+      if key not in state:
+        return
+      del state[key]
+    logger.debug("Removed key '%s' from state for %s", key, self.key)
+    self._dump_k8s_state()
 
   def _dump_k8s_state(self):
-    try:
-      with open(self._k8s_state_file_path, "w") as f:
-        json.dump(self._k8s_state, f, indent=2)
-      logger.debug(
-        "Saved state cache for %s to %s", self.key, self._k8s_state_file_path
-      )
-    except (IOError, TypeError, ValueError) as e:
-      logger.error(
-        "Failed to save state cache for %s to %s: %s",
-        self.key,
-        self._k8s_state_file_path,
-        e,
-      )
+    with self._k8s_state.transaction() as state:
+      snapshot = dict(state)
+    if snapshot == self._dumped_state:
+      logger.debug("State cache for %s is unchanged, not saving", self.key)
+      return
+    state_store.put(self.key_hash, snapshot)
+    self._dumped_state = snapshot
+    logger.debug("Saved state cache for %s", self.key)
 
   def enable_services(self):
     if not self.is_scalable:
       return
 
     if not self.is_monitoring:
-      self.start_monitoring()
+      state_watcher.register(self)
 
     if not self.is_proxying and not self.is_forwarding:
       self.start_forwarding()
 
-  def start_monitoring(self):
+  def _apply_observed_state(self, current_state: dict):
+    """Records the state of the resource as observed in the cluster."""
     try:
-      self._monitor_thread = threading.Thread(target=self._monitor_state, daemon=True)
-      self._monitor_thread.start()
-      return True
-    except Exception as e:
-      logger.error(
-        "Failed to start monitoring thread for %s: %s", self.key, e, exc_info=True
-      )
-      return False
-
-  def _monitor_state(self):
-    if threading.current_thread() is threading.main_thread():
-      raise RuntimeError("State monitor must not be started from the main thread.")
+      status = current_state.get("status", {})
+      container = get_first_container(current_state) or {}
+      proxy_installed = container.get("name") == K8S_REVERSE_PROXY_CONTAINER_NAME
+      # Most watch events change nothing we keep; saving those would only churn
+      if status == self.k8s_status and proxy_installed == self.is_proxying:
+        return
 
-    while True:
-      try:
-        current_state = kubectl.get_current_state(self.kind, self.name, self.namespace)
-      except Exception as e:
-        logger.warning("Failed to get current state for %s: %s", self.key, e)
-        continue
-
-      try:
-        status = current_state.get("status", {})
-        self._set_state("status", status, commit=False)
+      self._set_state("status", status, commit=False)
+      self._set_state("proxy_installed", proxy_installed, commit=False)
 
-        container = get_first_container(current_state) or {}
-        proxy_installed = container.get("name") == K8S_REVERSE_PROXY_CONTAINER_NAME
-        self._set_state("proxy_installed", proxy_installed)
+      now = datetime.datetime.now(datetime.timezone.utc)
+      self._set_state("observed_at", now.isoformat(), commit=True)
 
-        now = datetime.datetime.now(datetime.timezone.utc)
-        self._set_state("observed_at", now.isoformat(), commit=True)
-      except Exception as e:
-        logger.warning("Failed to update state cache for %s: %s", self.key, e)
-
-      time.sleep(random.uniform(1, 2))
+      if self.on_change:
+        self.on_change(self)
+    except Exception as e:
+      logger.warning("Failed to update state cache for %s: %s", self.key, e)
 
   def apply(self):
+    """Applies the resource unless it was last applied with the same content.
+
+    Returns:
+        True if changed, False if unchanged, or None if the apply failed.
+    """
+    current_hash = self.state_hash
+    if self._k8s_state.get("last_applied_hash") == current_hash:
+      logger.info("Resource %s is unchanged since last applied", self.key)
+      return False
+
     logger.info("Applying resource %s", self.key)
     try:
-      return kubectl.apply(self.yaml)
+      result = kubectl.apply(self.yaml)
     except Exception as e:
       logger.error("Failed to apply resource %s: %s", self.key, e)
+      return None
+
+    # Unchanged still means the cluster has this content, so remember it too
+    if result is not None:
+      self.mark_applied(current_hash)
+    return result
+
+  def mark_applied(self, state_hash: str | None = None):
+    """Records that the resource's current content is what the cluster has."""
+    self._set_state("last_applied_hash", state_hash or self.state_hash)
 
   def _infer_target_port(self) -> int | None:
     """Tries to infer a suitable target port from the resource spec."""
-    kind_lower = self.kind.lower()
-    spec = self._doc.get("spec", {})
+    if self._target_port_cache is _UNSET:
+      self._target_port_cache = self._find_target_port()
+    return self._target_port_cache
+
+  def _find_target_port(self) -> int | None:
+    path, port_key = _PORT_PATHS.get(self.kind.lower(), (None, None))
 
     try:
-      if kind_lower == "pod":
-        containers = spec.get("containers", [])
-        for container in containers:
-          ports = container.get("ports", [])
-          for port_info in ports:
-            if "containerPort" in port_info:
-              logger.debug(
-                "Inferred target port %d from containerPort", port_info["containerPort"]
-              )
-              return int(port_info["containerPort"])
-      elif kind_lower in ["deployment", "statefulset", "replicaset"]:
-        containers = spec.get("template", {}).get("spec", {}).get("containers", [])
-        for container in containers:
-          ports = container.get("ports", [])
-          for port_info in ports:
-            if "containerPort" in port_info:
-              logger.debug(
-                "Inferred target port %d from containerPort", port_info["containerPort"]
-              )
-              return int(port_info["containerPort"])
-      elif kind_lower == "service":
-        ports = spec.get("ports", [])
-        for port_info in ports:
-          if "port" in port_info:
-            logger.debug("Inferred target port %d from service port", port_info["port"])
-            return int(port_info["port"])
+      for ports in _iter_path(self._doc, path) if path else ():
+        for port_info in ports or []:
+          if port_key in port_info:
+            logger.debug(
+              "Inferred target port %d from %s", port_info[port_key], port_key
+            )
+            return int(port_info[port_key])
     except (TypeError, ValueError, KeyError, AttributeError) as e:
       logger.warning("Could not parse ports from spec for %s: %s", self.key, e)
 
@@ -262,37 +312,14 @@ class Resource:
 
   @property
   def is_forwarding(self) -> bool:
-    if process := self._forwarding_process:
-      return process.poll() is None
-    return False
-
-  def _forwarding_cleanup(self):
-    if process := self._forwarding_process:
-      try:
-        logger.info("Terminating port forward process for %s", self.key)
-        process.terminate()
-      except Exception as e:
-        logger.warning("Error while terminating port forward process: %s", e)
-
-  def start_forwarding(self):
-    try:
-      self._forwarding_thread = threading.Thread(
-        target=self._start_forwarding_process, daemon=True
-      )
-      self._forwarding_thread.start()
-      return True
-    except Exception as e:
-      logger.error(
-        "Failed to start forwarding thread for %s: %s", self.key, e, exc_info=True
-      )
-      return False
-
-  def _start_forwarding_process(self, local_port: int = None) -> bool:
-    if threading.current_thread() is threading.main_thread():
-      raise RuntimeError(
-        "Port forwarding process must not be started from the main thread."
-      )
-
+    # Read for every row of every frame, so don't poll the process each time
+    now = time.monotonic()
+    if now - self._forwarding_polled_at >= FORWARDING_POLL_INTERVAL:
+      self._forwarding_active = port_forward_manager.is_active(self.key)
+      self._forwarding_polled_at = now
+    return self._forwarding_active
+
+  def start_forwarding(self) -> bool:
     if self.is_forwarding:
       logger.warning("Port forwarding is already active for %s", self)
       return True
@@ -302,34 +329,29 @@ class Resource:
       logger.warning("Skipping port forwarding - No local port defined for %s.", self)
       return False
 
+    self._forwarding_polled_at = float("-inf")
     try:
-      target_port = self._infer_target_port()
-      self._forwarding_process = kubectl.port_forward(
+      started = port_forward_manager.start(
+        self.key,
         self.kind,
         self.name,
         self.namespace,
         local_port,
-        target_port,
+        self._infer_target_port(),
       )
       logger.info("Started port forwarding for %s on %s", self, local_port)
+      return started
     except Exception as e:
       logger.error("Failed to start port forwarding - %s", e, exc_info=True)
-
-    try:
-      atexit.register(self._forwarding_cleanup)
-      cleanup.register(lambda *_: self._forwarding_cleanup())
-    except Exception as e:
-      logger.error("Failed to set port forwarding cleanup hooks - %s", e, exc_info=True)
-
-    return self.is_forwarding
+      return False
 
   def stop_forwarding(self) -> bool:
     """Stops the active port forwarding process for this resource."""
-    if not self.is_forwarding:
+    self._forwarding_polled_at = float("-inf")
+    if not port_forward_manager.stop(self.key):
       logger.debug("Port forwarding is not active for %s, nothing to stop.", self.key)
       return False
-
-    self._forwarding_cleanup()
+    return True
 
   def _get_container_port(self):
     container = get_first_container(self._doc)
@@ -359,13 +381,15 @@ class Resource:
     )
 
     self._doc["spec"]["template"]["spec"]["containers"] = [reverse_proxy_container]
+    self._invalidate()
 
     logger.info("Injected reverse proxy container for %s", self.key)
 
   def _remove_reverse_proxy(self):
     try:
       current_replicas = self.replicas
-      self._doc = copy.deepcopy(self._original_doc)
+      self._doc = fast_dict_copy(self._original_doc)
+      self._invalidate()
       self.set_replicas(current_replicas, apply=True)
       logger.info("Removed reverse proxy for %s", self.key)
       return True
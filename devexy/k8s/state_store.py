@@ -0,0 +1,127 @@
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from devexy.k8s import utils
+from devexy.utils.logging import get_logger
+from devexy.utils.threading import cleanup
+
+logger = get_logger(__name__)
+
+# How long the writer waits for more changes before saving them all at once
+FLUSH_DELAY = 0.1
+
+
+class StateStore:
+  """
+  Keeps the cached state of every resource in a single file, keyed by resource,
+  so starting up reads and parses one file instead of one per resource.
+
+  Changes are saved by a background thread, so callers don't wait on disk I/O and
+  a burst of changes is written once.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    # Held for the whole of a write, so only one thread writes the file at a time
+    self._write_lock = threading.Lock()
+    self._states: dict[str, dict] = None
+    self._loaded_from: Path = None
+    self._dirty = False
+    self._pending = threading.Event()
+    self._writer: threading.Thread = None
+
+  @property
+  def path(self) -> Path:
+    return utils.STATE_CACHE_ROOT / "state.json"
+
+  def get(self, key: str) -> dict:
+    """Returns the saved state for the key, or an empty dict."""
+    with self._lock:
+      return dict(self._load().get(key) or {})
+
+  def put(self, key: str, state: dict):
+    """Saves the state for the key, replacing whatever was saved before."""
+    with self._lock:
+      self._load()[key] = dict(state)
+      self._dirty = True
+      if self._writer is None:
+        atexit.register(self.flush)
+        cleanup.register(lambda *_: self.flush())
+        self._writer = threading.Thread(target=self._write_pending, daemon=True)
+        self._writer.start()
+    self._pending.set()
+
+  def flush(self):
+    """Writes any unsaved changes now, without waiting for the writer."""
+    with self._write_lock:
+      with self._lock:
+        if not self._dirty:
+          return
+        self._dirty = False
+        path = self._loaded_from
+        try:
+          # Without indent, json uses its C encoder
+          content = json.dumps(self._states, separators=(",", ":")).encode("utf-8")
+        except (TypeError, ValueError) as e:
+          logger.error("Failed to serialize state cache: %s", e)
+          return
+      self._write(path, content)
+
+  def reset(self):
+    """Forgets every state, saved or not, so the next access reloads the file."""
+    with self._write_lock, self._lock:
+      self._states = None
+      self._loaded_from = None
+      self._dirty = False
+
+  def _write_pending(self):
+    while True:
+      self._pending.wait()
+      time.sleep(FLUSH_DELAY)
+      self._pending.clear()
+      self.flush()
+
+  def _load(self) -> dict[str, dict]:
+    path = self.path
+    if self._states is not None and self._loaded_from == path:
+      return self._states
+
+    self._states = {}
+    self._loaded_from = path
+    try:
+      content = path.read_bytes()
+    except FileNotFoundError:
+      logger.debug("State cache does not exist: %s", path)
+      return self._states
+
+    try:
+      states = json.loads(content) if content else {}
+    except ValueError as e:
+      logger.warning("Ignoring unreadable state cache %s: %s", path, e)
+      return self._states
+    if isinstance(states, dict):
+      self._states = states
+      logger.info("Loaded state cache from %s", path)
+    return self._states
+
+  def _write(self, path: Path, content: bytes):
+    try:
+      # Swap in a complete file, so a crash can't leave a truncated cache behind
+      tmp_file = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+      try:
+        tmp_file.write_bytes(content)
+      except FileNotFoundError:
+        # The cache directory is only created once something is saved
+        tmp_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file.write_bytes(content)
+      os.replace(tmp_file, path)
+      logger.debug("Saved state cache to %s", path)
+    except OSError as e:
+      logger.error("Failed to save state cache to %s: %s", path, e)
+
+
+state_store = StateStore()
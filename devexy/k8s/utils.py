@@ -1,4 +1,9 @@
-from typing import Iterator
+import json
+import shutil
+import string
+import sys
+from collections.abc import Iterator
+from typing import IO
 
 import yaml
 
@@ -14,15 +19,23 @@ from devexy.utils.text import secure_hash
 
 logger = get_logger(__name__)
 
-CLUSTER_HASH = secure_hash(str(KUSTOMIZE_ROOT.resolve()))
+try:
+  from yaml import CSafeLoader as _Loader
+except ImportError:
+  from yaml import SafeLoader as _Loader
+
+  logger.warning("libyaml is not available, falling back to the pure-Python loader")
+
+# Bump the version whenever the layout of the state cache changes
+CLUSTER_HASH = secure_hash(f"v2|{KUSTOMIZE_ROOT.resolve()}")
 STATE_CACHE_ROOT = APP_DIR / "k8s_cache" / CLUSTER_HASH
-STATE_CACHE_ROOT.mkdir(parents=True, exist_ok=True)
-SCALABLE_KINDS = ["deployment", "replicaset", "statefulset"]
+LAST_APPLIED_ANNOTATION = "kubectl.kubernetes.io/last-applied-configuration"
+SCALABLE_KINDS = frozenset({"deployment", "replicaset", "statefulset"})
 
 
-def yaml_to_dicts(yaml_content: str) -> Iterator[dict]:
+def yaml_to_dicts(yaml_content: str | IO[str]) -> Iterator[dict]:
   """Parses YAML content and yields only valid dictionary documents as Resource instances."""
-  all_docs = yaml.safe_load_all(yaml_content)
+  all_docs = yaml.load_all(yaml_content, Loader=_Loader)
   for doc in all_docs:
     if isinstance(doc, dict):
       yield doc
@@ -33,24 +46,33 @@ def yaml_to_dicts(yaml_content: str) -> Iterator[dict]:
 def dict_to_yaml(doc: dict):
   """
   Serialize the doc consistently for hashing.
+
+  The output is JSON, which is valid YAML and accepted by `kubectl apply`, but is
+  much cheaper to produce than PyYAML's emitter.
   """
-  return yaml.dump(doc, sort_keys=True, default_flow_style=False)
+  return json.dumps(
+    doc, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str
+  )
 
 
 def get_kind(doc: dict, default=K8S_DEFAULT_RESOURCE_KIND):
   return str(doc.get("kind", default))
 
 
+# The accessors below return the doc's own containers rather than copies, so callers
+# must not modify what they get back.
+
+
 def get_spec(doc: dict):
-  return dict(doc.get("spec", {}))
+  return doc.get("spec") or {}
 
 
 def get_metadata(doc: dict):
-  return dict(doc.get("metadata", {}))
+  return doc.get("metadata") or {}
 
 
 def get_annotations(doc: dict):
-  return dict(get_metadata(doc).get("annotations", {}))
+  return get_metadata(doc).get("annotations") or {}
 
 
 def get_namespace(doc: dict, default=K8S_DEFAULT_NAMESPACE):
@@ -61,16 +83,33 @@ def get_name(doc: dict, default=K8S_DEFAULT_RESOURCE_NAME):
   return str(get_metadata(doc).get("name", default))
 
 
+def format_key(namespace: str, kind: str, name: str):
+  # Keys are built for the same resources over and over (kustomize output, cluster
+  # listings, watch events); interning makes them one shared string, which also
+  # lets dict lookups match on identity
+  return sys.intern(f"{namespace}/{kind}/{name}".lower())
+
+
+def _identity(doc: dict) -> tuple[str, str, str]:
+  """Returns the namespace, kind and name of the doc, reading its metadata once."""
+  metadata = get_metadata(doc)
+  return (
+    str(metadata.get("namespace", K8S_DEFAULT_NAMESPACE)),
+    str(doc.get("kind", K8S_DEFAULT_RESOURCE_KIND)),
+    str(metadata.get("name", K8S_DEFAULT_RESOURCE_NAME)),
+  )
+
+
 def get_key(doc: dict):
-  return f"{get_namespace(doc)}/{get_kind(doc)}/{get_name(doc)}".lower()
+  return format_key(*_identity(doc))
 
 
 def get_spec_template(doc: dict):
-  return dict(get_spec(doc).get("template", {}))
+  return get_spec(doc).get("template") or {}
 
 
 def get_spec_containers(doc: dict):
-  return list(get_spec(doc).get("containers", []))
+  return get_spec(doc).get("containers") or []
 
 
 def get_first_container(doc: dict):
@@ -80,6 +119,10 @@ def get_first_container(doc: dict):
   return None
 
 
+def is_scalable_kind(kind: str):
+  return kind.lower() in SCALABLE_KINDS
+
+
 def get_replicas(doc: dict, default=None):
   return get_spec(doc).get("replicas", default)
 
@@ -98,6 +141,24 @@ def is_proxy_installed(doc: dict):
   return installed
 
 
+# nginx's own variables are escaped as $$
+_NGINX_CONFIG = string.Template(
+  "events {}\n"
+  "http {\n"
+  "  server {\n"
+  "    listen ${container_port};\n"
+  "    location / {\n"
+  "      proxy_pass ${local_protocol}://${local_host}:${local_port};\n"
+  "      proxy_set_header Host $$host;\n"
+  "      proxy_set_header X-Real-IP $$remote_addr;\n"
+  "      proxy_set_header X-Forwarded-For $$proxy_add_x_forwarded_for;\n"
+  "      proxy_set_header X-Forwarded-Proto $$scheme;\n"
+  "    }\n"
+  "  }\n"
+  "}\n"
+)
+
+
 def get_reverse_proxy_container(
   local_port: int,
   local_protocol: str = "http",
@@ -105,20 +166,11 @@ def get_reverse_proxy_container(
   container_port: int = 80,
 ) -> dict:
   """Returns an nginx reverse proxy deployment document with embedded nginx configuration."""
-  nginx_config = (
-    "events {}\n"
-    "http {\n"
-    "  server {\n"
-    f"    listen {container_port};\n"
-    "    location / {\n"
-    f"      proxy_pass {local_protocol}://{local_host}:{local_port};\n"
-    "      proxy_set_header Host $host;\n"
-    "      proxy_set_header X-Real-IP $remote_addr;\n"
-    "      proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;\n"
-    "      proxy_set_header X-Forwarded-Proto $scheme;\n"
-    "    }\n"
-    "  }\n"
-    "}\n"
+  nginx_config = _NGINX_CONFIG.substitute(
+    container_port=container_port,
+    local_protocol=local_protocol,
+    local_host=local_host,
+    local_port=local_port,
   )
 
   return {
@@ -133,22 +185,35 @@ def get_reverse_proxy_container(
 
 
 def clear_cache():
+  # Imported here, as the state store itself depends on this module
+  from devexy.k8s.state_store import state_store
+
+  # Drop what is loaded too, or the next save would write it all back
+  state_store.reset()
   try:
-    for item in STATE_CACHE_ROOT.iterdir():
-      if item.is_dir():
-        item.rmdir()
-      else:
-        item.unlink()
+    shutil.rmtree(STATE_CACHE_ROOT, ignore_errors=True)
   except Exception as e:
     logger.error("Failed to clear cache: %s", e)
 
 
-def get_last_applied_configuration(doc: dict) -> dict | None:
-  annotations = get_annotations(doc)
-  last_applied = annotations.get("kubectl.kubernetes.io/last-applied-configuration")
+def get_last_applied_annotation(doc: dict) -> str | None:
+  """Returns the last applied configuration of the doc as stored, without parsing."""
+  return get_annotations(doc).get(LAST_APPLIED_ANNOTATION) or None
+
+
+def parse_last_applied_configuration(last_applied: str | None) -> dict | None:
   if last_applied:
     try:
-      return yaml.safe_load(last_applied)
+      # kubectl stores the annotation as JSON, which parses far faster than YAML
+      return json.loads(last_applied)
+    except ValueError:
+      pass
+    try:
+      return yaml.load(last_applied, Loader=_Loader)
     except yaml.YAMLError as e:
       logger.error("Failed to parse last applied configuration: %s", e)
   return None
+
+
+def get_last_applied_configuration(doc: dict) -> dict | None:
+  return parse_last_applied_configuration(get_last_applied_annotation(doc))
@@ -0,0 +1,120 @@
+import atexit
+import json
+import subprocess
+import tempfile
+import threading
+import time
+from collections.abc import Iterator
+from typing import IO, TYPE_CHECKING
+
+from devexy.exceptions import ToolError
+from devexy.k8s.utils import get_key
+from devexy.tools.kubectl import kubectl
+from devexy.utils.logging import get_logger
+from devexy.utils.threading import cleanup
+
+if TYPE_CHECKING:
+  from devexy.k8s.models.resource import Resource
+
+logger = get_logger(__name__)
+
+MIN_RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 30.0
+
+
+def _iter_json_docs(stream: IO[str]) -> Iterator[dict]:
+  """Yields the objects of a stream of pretty-printed JSON documents, as printed by
+  `kubectl get --watch -o json`. Only the closing brace of a document is unindented.
+  """
+  lines = []
+  for line in stream:
+    lines.append(line)
+    if line.rstrip("\r\n") == "}":
+      try:
+        yield json.loads("".join(lines))
+      except ValueError as e:
+        logger.warning("Skipping unparseable watch event: %s", e)
+      lines = []
+
+
+class StateWatcher:
+  """
+  Keeps registered resources up to date from a single `kubectl get --watch` per
+  kind and namespace. The server pushes each change as it happens, so there is
+  no polling, and the number of threads and processes doesn't grow with the
+  number of resources.
+  """
+
+  def __init__(self):
+    self._resources: dict[str, "Resource"] = {}
+    self._threads: dict[tuple[str, str], threading.Thread] = {}
+    self._processes: set[subprocess.Popen] = set()
+    self._lock = threading.Lock()
+    self._stopped = False
+
+  def is_watching(self, resource: "Resource") -> bool:
+    return resource.key in self._resources
+
+  def register(self, resource: "Resource"):
+    """Starts delivering observed state to the resource."""
+    target = (resource.kind.lower(), resource.namespace)
+    with self._lock:
+      self._resources[resource.key] = resource
+      if target in self._threads:
+        return
+      if not self._threads:
+        atexit.register(self.stop)
+        cleanup.register(lambda *_: self.stop())
+      thread = threading.Thread(target=self._watch, args=target, daemon=True)
+      self._threads[target] = thread
+    thread.start()
+
+  def stop(self):
+    self._stopped = True
+    for process in list(self._processes):
+      try:
+        process.terminate()
+      except OSError as e:
+        logger.warning("Error while terminating watch process: %s", e)
+
+  def _watch(self, kind: str, namespace: str):
+    if threading.current_thread() is threading.main_thread():
+      raise RuntimeError("State watcher must not be started from the main thread.")
+
+    delay = MIN_RESTART_DELAY
+    while not self._stopped:
+      # stderr goes to a file so a chatty watch can't block on a full pipe
+      with tempfile.TemporaryFile(mode="w+", encoding="utf-8") as stderr:
+        try:
+          process = kubectl.watch(kind, namespace, stderr)
+        except (OSError, ToolError) as e:
+          logger.warning("Failed to watch %s in %s: %s", kind, namespace, e)
+        else:
+          self._processes.add(process)
+          try:
+            for doc in _iter_json_docs(process.stdout):
+              delay = MIN_RESTART_DELAY
+              self._dispatch(doc)
+          finally:
+            self._processes.discard(process)
+            process.kill()
+            process.wait()
+          if not self._stopped:
+            stderr.seek(0)
+            logger.info(
+              "Watch of %s in %s ended, restarting: %s",
+              kind,
+              namespace,
+              stderr.read().strip() or "no error output",
+            )
+
+      # The server closes watches periodically, and the cluster may be down
+      time.sleep(delay)
+      delay = min(delay * 2, MAX_RESTART_DELAY)
+
+  def _dispatch(self, doc: dict):
+    if resource := self._resources.get(get_key(doc)):
+      resource._apply_observed_state(doc)
+
+
+state_watcher = StateWatcher()
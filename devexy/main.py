@@ -1,17 +1,16 @@
 #!/usr/bin/env python
 import importlib
 import logging
-import pkgutil
-from pathlib import Path
 from typing import Optional
 
+import click
 import typer
+from typer.core import TyperGroup
 
 from devexy import settings
+from devexy.commands._registry import COMMANDS
 from devexy.utils.logging import configure_logger
 
-app = typer.Typer(no_args_is_help=True)
-
 
 def get_typer_instance(module) -> Optional[typer.Typer]:
   app = getattr(module, "app", None)
@@ -20,17 +19,33 @@ def get_typer_instance(module) -> Optional[typer.Typer]:
   return None
 
 
-# Import commands dynamically
-commands_path = Path(__file__).parent / "commands"
-for module_info in pkgutil.iter_modules([str(commands_path)]):
-  module_name = f"devexy.commands.{module_info.name}"
-  try:
-    module = importlib.import_module(module_name)
-    typer_instance = get_typer_instance(module)
-    if typer_instance:
-      app.add_typer(typer_instance)
-  except Exception as e:
-    logging.exception(f"Failed to load command module {module_name}: {e}")
+class LazyCommandGroup(TyperGroup):
+  """Imports a command's module only when that command is looked up, so running one
+  command doesn't import every other command's dependencies."""
+
+  def list_commands(self, ctx: click.Context) -> list[str]:
+    return sorted({*super().list_commands(ctx), *COMMANDS})
+
+  def get_command(self, ctx: click.Context, cmd_name: str) -> click.Command | None:
+    module_name = COMMANDS.get(cmd_name)
+    if module_name is None:
+      return super().get_command(ctx, cmd_name)
+
+    try:
+      module = importlib.import_module(module_name)
+      typer_instance = get_typer_instance(module)
+      if typer_instance:
+        # Completion options belong to the top-level app only, as with add_typer
+        typer_instance._add_completion = False
+        command = typer.main.get_command(typer_instance)
+        command.name = cmd_name
+        return command
+    except Exception as e:
+      logging.exception(f"Failed to load command module {module_name}: {e}")
+    return None
+
+
+app = typer.Typer(no_args_is_help=True, cls=LazyCommandGroup)
 
 
 @app.callback()
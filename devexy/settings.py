@@ -5,14 +5,16 @@ from castaway import config
 
 from devexy.constants import APP_NAME
 
+# Created by whatever first writes to it, so startup doesn't touch the filesystem
 APP_DIR = Path(typer.get_app_dir(APP_NAME))
-APP_DIR.mkdir(parents=True, exist_ok=True)
 
 DEBUG: bool = config("DEVEXY_DEBUG", default=False, cast=bool)
 
 KUSTOMIZE_ROOT: Path = config("DEVEXY_KUSTOMIZE_ROOT", default="./k8s/", cast=Path)
 KUSTOMIZE_OVERLAY: str = config("DEVEXY_KUSTOMIZE_OVERLAY", default="local")
 KUSTOMIZE_OVERLAY_DIR = KUSTOMIZE_ROOT / "overlays" / KUSTOMIZE_OVERLAY
+KUSTOMIZE_CACHE: bool = config("DEVEXY_KUSTOMIZE_CACHE", default=True, cast=bool)
+KUBE_API: bool = config("DEVEXY_KUBE_API", default=False, cast=bool)
 LOCAL_PORT_ANNOTATION: str = config(
   "DEVEXY_LOCAL_PORT_ANNOTATION", default="devexy/local-port"
 )
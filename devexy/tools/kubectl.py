@@ -1,9 +1,17 @@
 import json
 import subprocess
+from typing import IO
 
 from devexy.constants import K8S_DEFAULT_NAMESPACE
 from devexy.exceptions import ToolError
-from devexy.k8s.utils import get_last_applied_configuration, get_name
+from devexy.k8s.utils import (
+  get_key,
+  get_last_applied_annotation,
+  get_last_applied_configuration,
+  get_name,
+  get_replicas,
+)
+from devexy.tools.kubectl_api import kubectl_api
 from devexy.tools.tool import Tool
 from devexy.utils import logging
 from devexy.utils.text import quick_hash
@@ -24,6 +32,30 @@ class Kubectl(Tool):
         return False
       return True
 
+  def apply_many(self, yaml_docs: list[str]) -> dict[str, bool]:
+    """Applies several documents with a single kubectl call, in order.
+
+    Args:
+        yaml_docs (list[str]): The documents to apply.
+
+    Returns:
+        dict[str, bool]: Whether each resource changed, by the name kubectl reports
+          it as (e.g. "deployment.apps/web"; see `Resource.apply_name`).
+
+    Raises:
+        ToolError: If kubectl failed to apply any of the documents.
+    """
+    response = self.exec("apply", "-f", "-", input="\n---\n".join(yaml_docs))
+    logger.debug(
+      "kubectl apply response for %d documents: %s", len(yaml_docs), response
+    )
+    results = {}
+    for line in (response or "").splitlines():
+      name, _, outcome = line.strip().partition(" ")
+      if name:
+        results[name] = outcome != "unchanged"
+    return results
+
   def create_namespace_if_not_exists(self, namespace: str) -> str:
     """Safely creates a namespace.
 
@@ -88,9 +120,26 @@ class Kubectl(Tool):
     kind: str,
     name: str,
     namespace: str = "default",
+    cached: bool = False,
   ) -> dict | None:
+    """
+    Fetches a resource as a dictionary, or `None` if it does not exist.
+    Pass `cached` to accept a slightly stale copy from the API server's cache,
+    which is much cheaper; kubectl has no such option, so it only applies when
+    the API client is in use.
+    """
+    if kubectl_api.is_available:
+      try:
+        return kubectl_api.get_current_state(kind, name, namespace, cached=cached)
+      except kubectl_api.errors as e:
+        kubectl_api.log_fallback(
+          "API lookup of %s/%s failed, using kubectl: %s", kind, name, e
+        )
+
     try:
-      return json.loads(self.exec("get", kind, name, "-n", namespace, "-o", "json"))
+      return json.loads(
+        self.exec("get", kind, name, "-n", namespace, "-o", "json", text=False)
+      )
     except ToolError as e:
       if "NotFound" in e.stderr:
         return None
@@ -99,6 +148,27 @@ class Kubectl(Tool):
           f"Error getting current state for {kind}/{name} in namespace {namespace}: {e.stderr}"
         ) from e
 
+  def get_replicas(
+    self,
+    name: str,
+    kind: str,
+    namespace: str = "default",
+  ) -> int | None:
+    """
+    Fetches the desired replica count of a resource.
+
+    The whole resource is fetched through `get_current_state`, which can use the API
+    client's connection rather than starting kubectl just to read one field.
+
+    Returns:
+        int | None: The replica count, or `None` if the resource does not exist.
+
+    Raises:
+        RuntimeError: If fetching the resource fails.
+    """
+    doc = self.get_current_state(kind, name, namespace)
+    return get_replicas(doc) if doc else None
+
   def port_forward(
     self,
     kind: str,
@@ -136,16 +206,40 @@ class Kubectl(Tool):
     )
     return process
 
+  def watch(self, kind: str, namespace: str, stderr: IO[str]) -> subprocess.Popen:
+    """Starts 'kubectl get --watch' for every resource of a kind in a namespace.
+
+    The current state of each resource, then every change to it, is written to the
+    process's stdout as a pretty-printed JSON document. Its stderr goes to `stderr`,
+    which must be a real file; nothing reads a pipe while the watch runs.
+    """
+    return self.start(
+      "get",
+      kind,
+      "-n",
+      namespace,
+      "--watch",
+      "-o",
+      "json",
+      capture_output=True,
+      stderr=stderr,
+    )
+
   def get_resource_docs(
     self,
     kind: str,
-    namespace: str = K8S_DEFAULT_NAMESPACE,
+    namespace: str | None = K8S_DEFAULT_NAMESPACE,
+    cached: bool = False,
   ) -> list[dict]:
     """
     Fetches all resources of a specific kind from the Kubernetes cluster.
 
     Args:
         kind (str): The kind of resource to fetch (e.g., 'Deployment', 'Pod').
+          Several kinds can be fetched at once by separating them with commas.
+        namespace (str | None): The namespace to search, or `None` for all of them.
+        cached (bool): Accept a slightly stale listing from the API server's cache.
+          Only honoured when the API client is in use.
 
     Returns:
         list[dict]: A list of resources represented as dictionaries.
@@ -153,13 +247,50 @@ class Kubectl(Tool):
     Raises:
         RuntimeError: If fetching resources fails.
     """
+    if cached and kubectl_api.is_available:
+      try:
+        return [
+          doc
+          for k in kind.split(",")
+          for doc in kubectl_api.get_resource_docs(k, namespace, cached=True)
+        ]
+      except kubectl_api.errors as e:
+        kubectl_api.log_fallback("API listing of %s failed, using kubectl: %s", kind, e)
+
+    namespace_args = ["-n", namespace] if namespace else ["--all-namespaces"]
     try:
-      output = self.exec("get", kind, "-n", namespace, "-o", "json")
+      output = self.exec("get", kind, *namespace_args, "-o", "json", text=False)
       resources = json.loads(output).get("items", [])
       return resources
     except ToolError as e:
       raise RuntimeError(f"Error fetching resources of kind {kind}: {e.stderr}") from e
 
+  def get_last_applied_docs(
+    self,
+    kinds: list[str],
+    raw: bool = False,
+  ) -> dict[str, dict | str | None]:
+    """
+    Fetches the last applied configuration of every resource of the given kinds,
+    across all namespaces, with a single kubectl call.
+
+    Args:
+        kinds (list[str]): The kinds of resource to fetch.
+        raw (bool): Return each configuration as stored by kubectl, unparsed.
+
+    Returns:
+        dict[str, dict | str | None]: Last applied docs keyed by resource key.
+          Resources without a last applied configuration map to `None`.
+
+    Raises:
+        RuntimeError: If fetching resources fails.
+    """
+    docs = self.get_resource_docs(",".join(kinds), namespace=None)
+    get_last_applied = (
+      get_last_applied_annotation if raw else get_last_applied_configuration
+    )
+    return {get_key(doc): get_last_applied(doc) for doc in docs}
+
   def get_namespaces(self) -> list[str]:
     """
     Fetches all namespaces from the Kubernetes cluster.
@@ -171,7 +302,7 @@ class Kubectl(Tool):
         RuntimeError: If fetching namespaces fails.
     """
     try:
-      output = self.exec("get", "namespaces", "-o", "json")
+      output = self.exec("get", "namespaces", "-o", "json", text=False)
       namespaces = [get_name(item) for item in json.loads(output).get("items", [])]
       return namespaces
     except ToolError as e:
@@ -0,0 +1,147 @@
+import threading
+
+from devexy import settings
+from devexy.k8s import disco_cache
+from devexy.utils.logging import get_logger
+from devexy.utils.text import quick_hash
+
+logger = get_logger(__name__)
+
+# How long what the API server offers is trusted, the same as kubectl
+DISCOVERY_TTL = 600
+
+# The Kind of the lowercase resource names used with kubectl. The client matches
+# Kinds exactly, and a miss makes it throw away its discovery cache.
+_KINDS = {
+  "deployment": "Deployment",
+  "namespace": "Namespace",
+  "pod": "Pod",
+  "replicaset": "ReplicaSet",
+  "service": "Service",
+  "statefulset": "StatefulSet",
+}
+
+
+class KubectlApi:
+  """
+  Reads cluster state through the Kubernetes API client, using the same kubeconfig
+  as kubectl. One authenticated connection is reused for every request, instead of
+  paying for a kubectl process, kubeconfig parse and TLS handshake per call.
+
+  The client is created on first use, since importing it is slow.
+  """
+
+  def __init__(self):
+    self._client = None
+    self._unavailable = False
+    self._warned = False
+    self._lock = threading.Lock()
+
+  @property
+  def client(self):
+    with self._lock:
+      if self._client is None and not self._unavailable:
+        try:
+          from kubernetes import config, dynamic
+          from kubernetes.config.config_exception import ConfigException
+
+          try:
+            api_client = config.new_client_from_config()
+            # The client only rediscovers the API when asked for something unknown
+            cache_file = disco_cache.cache_file(
+              f"api-{quick_hash(api_client.configuration.host)}", DISCOVERY_TTL
+            )
+            self._client = dynamic.DynamicClient(api_client, cache_file=str(cache_file))
+          except (ConfigException, OSError, *self.errors) as e:
+            logger.warning("Kubernetes API client unavailable, using kubectl: %s", e)
+            self._unavailable = True
+        except ImportError as e:
+          logger.warning("Kubernetes API client unavailable, using kubectl: %s", e)
+          self._unavailable = True
+    return self._client
+
+  @property
+  def errors(self) -> tuple[type[Exception], ...]:
+    """The errors a request can fail with, to fall back to kubectl on.
+    Only import these once the client is in use, as importing it is slow."""
+    from kubernetes.client.exceptions import ApiException
+    from kubernetes.dynamic.exceptions import (
+      ResourceNotFoundError,
+      ResourceNotUniqueError,
+    )
+    from urllib3.exceptions import HTTPError
+
+    return (ApiException, HTTPError, ResourceNotFoundError, ResourceNotUniqueError)
+
+  def log_fallback(self, message: str, *args):
+    """Logs a failed request that will be retried with kubectl, loudly only once."""
+    log = logger.debug if self._warned else logger.warning
+    self._warned = True
+    log(message, *args)
+
+  @property
+  def is_available(self) -> bool:
+    return settings.KUBE_API and self.client is not None
+
+  def get_current_state(
+    self,
+    kind: str,
+    name: str,
+    namespace: str,
+    cached: bool = False,
+  ) -> dict | None:
+    """
+    Fetches a resource as a dictionary, or `None` if it does not exist.
+
+    When `cached` is set, the API server may answer from its watch cache rather
+    than a quorum read of etcd, so the result can be slightly stale.
+
+    Raises:
+        kubernetes.dynamic.exceptions.DynamicApiError: If the request fails.
+        kubernetes.dynamic.exceptions.ResourceNotFoundError: If `kind` is unknown.
+    """
+    from kubernetes.dynamic.exceptions import NotFoundError
+
+    api = self._get_api(kind)
+    try:
+      return api.get(name=name, namespace=namespace, **_read_options(cached)).to_dict()
+    except NotFoundError:
+      return None
+
+  def get_resource_docs(
+    self,
+    kind: str,
+    namespace: str | None,
+    cached: bool = False,
+  ) -> list[dict]:
+    """
+    Lists every resource of a kind, in one namespace or all of them (`None`).
+    See `get_current_state` for the meaning of `cached`.
+
+    Raises:
+        kubernetes.dynamic.exceptions.DynamicApiError: If the request fails.
+        kubernetes.dynamic.exceptions.ResourceNotFoundError: If `kind` is unknown.
+    """
+    api = self._get_api(kind)
+    items = api.get(namespace=namespace, **_read_options(cached)).to_dict()["items"]
+    # Unlike kubectl, the API leaves the type off the items of a list
+    for item in items:
+      item.setdefault("apiVersion", api.group_version)
+      item.setdefault("kind", api.kind)
+    return items
+
+  def _get_api(self, kind: str):
+    """Finds the API of a resource given as a Kind or a kubectl resource name."""
+    if kind in _KINDS:
+      return self.client.resources.get(kind=_KINDS[kind])
+    if kind.islower():
+      return self.client.resources.get(singular_name=kind)
+    return self.client.resources.get(kind=kind)
+
+
+def _read_options(cached: bool) -> dict:
+  # resourceVersion=0 means "any version", which lets the server use its cache
+  return {"resource_version": "0"} if cached else {}
+
+
+kubectl_api = KubectlApi()
@@ -1,21 +1,71 @@
-import subprocess
+import hashlib
+import json
+import os
+from contextlib import AbstractContextManager
+from pathlib import Path
+from typing import IO
 
+from devexy import settings
+from devexy.k8s.utils import yaml_to_dicts
+from devexy.settings import APP_DIR, KUSTOMIZE_ROOT
 from devexy.tools.tool import Tool
-from devexy.exceptions import ExecutableError
+from devexy.utils.logging import get_logger
+from devexy.utils.text import quick_hash
+
+logger = get_logger(__name__)
+
+BUILD_CACHE_ROOT = APP_DIR / "kustomize_cache"
+
+
+def _tree_digest(root: Path, target: Path) -> str:
+  """Fingerprints every file under `root` by path, mtime and size."""
+  digest = hashlib.blake2b(str(target).encode("utf-8"))
+  for file_path in sorted(root.rglob("*")):
+    if not file_path.is_file():
+      continue
+    stat = file_path.stat()
+    entry = f"{file_path.relative_to(root)}\0{stat.st_mtime_ns}\0{stat.st_size}\n"
+    digest.update(entry.encode("utf-8"))
+  return digest.hexdigest()
+
+
+def _write_atomic(path: Path, content: str):
+  path.parent.mkdir(parents=True, exist_ok=True)
+  # Unique per process, so concurrent runs can't swap in each other's partial file
+  tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+  tmp_path.write_text(content, encoding="utf-8")
+  os.replace(tmp_path, path)
+
+
+def _prune_stale(cache_base: Path):
+  """Removes the cached builds of a target other than the one at `cache_base`."""
+  prefix = f"{cache_base.name}."
+  for file_path in cache_base.parent.iterdir():
+    # Temporary files may belong to a build that is still being written
+    if not file_path.name.startswith(prefix) and file_path.suffix != ".tmp":
+      file_path.unlink(missing_ok=True)
+
+
+class _Tee:
+  """Reads from a stream, keeping a copy of everything read."""
+
+  def __init__(self, stream: IO[str]):
+    self._stream = stream
+    self._chunks: list[str] = []
+
+  def read(self, size: int = -1) -> str:
+    chunk = self._stream.read(size)
+    self._chunks.append(chunk)
+    return chunk
+
+  def getvalue(self) -> str:
+    return "".join(self._chunks)
 
 
 class Kustomize(Tool):
   def __init__(self):
     super().__init__("kustomize")
 
-  @property
-  def is_installed(self) -> bool:
-    try:
-      self.exec("version")
-      return True
-    except (subprocess.CalledProcessError, ExecutableError):
-      return False
-
   def build(self, path: str) -> str:
     """
     Runs 'kustomize build' on the given path and returns the YAML output.
@@ -32,5 +82,105 @@ class Kustomize(Tool):
     """
     return self.exec("build", path)
 
+  def build_stream(self, path: str) -> AbstractContextManager[IO[str]]:
+    """
+    Runs 'kustomize build' on the given path, yielding the YAML output as a stream
+    while it is being produced.
+
+    Raises:
+        ToolError: If kustomize build fails.
+        ExecutableError: If the kustomize executable is not found.
+    """
+    return self.stream("build", path)
+
+  def _build_docs(self, path: Path) -> list[dict]:
+    with self.build_stream(path) as stream:
+      return list(yaml_to_dicts(stream))
+
+  def _cache_base(self, path: Path) -> Path:
+    # Builds of one target share a directory, so older ones can be pruned
+    target_dir = BUILD_CACHE_ROOT / quick_hash(str(path))
+    return target_dir / _tree_digest(KUSTOMIZE_ROOT.resolve(), path)
+
+  def _read_cached(self, path: Path, cache_file: Path) -> str | None:
+    if not cache_file.is_file():
+      return None
+    logger.debug("Using cached kustomize build for %s: %s", path, cache_file)
+    return cache_file.read_text(encoding="utf-8")
+
+  def _cache_build(self, path: Path, cache_file: Path, yaml_output: str):
+    try:
+      _write_atomic(cache_file, yaml_output)
+      logger.debug("Cached kustomize build for %s: %s", path, cache_file)
+      _prune_stale(cache_file.with_suffix(""))
+    except OSError as e:
+      logger.warning("Failed to cache kustomize build for %s: %s", path, e)
+
+  def _build_cached(self, path: Path, cache_base: Path) -> str:
+    cache_file = cache_base.with_suffix(".yaml")
+    yaml_output = self._read_cached(path, cache_file)
+    if yaml_output is None:
+      yaml_output = self.build(path)
+      self._cache_build(path, cache_file, yaml_output)
+    return yaml_output
+
+  def build_cached(self, path: Path) -> str:
+    """
+    Like `build`, but reuses the previous output if nothing under the kustomize
+    root has changed since. Overlays usually pull in bases from outside their own
+    directory, so the whole root is fingerprinted, not just `path`.
+    """
+    if not settings.KUSTOMIZE_CACHE:
+      return self.build(path)
+
+    path = Path(path).resolve()
+    return self._build_cached(path, self._cache_base(path))
+
+  def build_docs(self, path: Path) -> list[dict]:
+    """
+    Returns the documents produced by `kustomize build`, already parsed.
+
+    The parsed documents are cached as JSON until something under the kustomize root
+    changes, which is much cheaper to load than re-parsing the YAML. The YAML build
+    output is cached as well, for documents that can't be stored as JSON.
+
+    Raises:
+        ToolError: If kustomize build fails.
+        ExecutableError: If the kustomize executable is not found.
+        yaml.YAMLError: If the build output is not valid YAML.
+    """
+    if not settings.KUSTOMIZE_CACHE:
+      # Parse while kustomize is still writing, rather than buffering all its output
+      return self._build_docs(path)
+
+    path = Path(path).resolve()
+    cache_base = self._cache_base(path)
+    docs_file = cache_base.with_suffix(".json")
+    if docs_file.is_file():
+      try:
+        docs = json.loads(docs_file.read_text(encoding="utf-8"))
+        logger.debug("Using cached documents for %s: %s", path, docs_file)
+        return docs
+      except (OSError, ValueError) as e:
+        logger.warning("Failed to load cached documents for %s: %s", path, e)
+
+    yaml_file = cache_base.with_suffix(".yaml")
+    yaml_output = self._read_cached(path, yaml_file)
+    if yaml_output is not None:
+      docs = list(yaml_to_dicts(yaml_output))
+    else:
+      # Parse while kustomize is still writing, keeping a copy of its output to cache
+      with self.build_stream(path) as stream:
+        tee = _Tee(stream)
+        docs = list(yaml_to_dicts(tee))
+      self._cache_build(path, yaml_file, tee.getvalue())
+
+    try:
+      _write_atomic(docs_file, json.dumps(docs))
+    except (OSError, TypeError, ValueError) as e:
+      # YAML can hold values JSON can't (e.g. timestamps); the YAML cache remains
+      logger.warning("Failed to cache documents for %s: %s", path, e)
+    return docs
+
 
 kustomize = Kustomize()
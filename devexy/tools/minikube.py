@@ -6,14 +6,6 @@ class Minikube(Tool):
   def __init__(self):
     super().__init__("minikube")
 
-  @property
-  def is_installed(self) -> bool:
-    try:
-      self.exec("version")
-      return True
-    except (ExecutableError, ToolError):
-      return False
-
   @property
   def is_initialized(self) -> bool:
     try:
@@ -0,0 +1,71 @@
+import atexit
+import subprocess
+import threading
+
+from devexy.tools.kubectl import kubectl
+from devexy.utils.logging import get_logger
+from devexy.utils.threading import cleanup
+
+logger = get_logger(__name__)
+
+
+class PortForwardManager:
+  """
+  Owns every `kubectl port-forward` process, by resource key. Processes are started
+  directly, as Popen doesn't block, and a single pair of exit hooks stops them all.
+  """
+
+  def __init__(self):
+    self._processes: dict[str, subprocess.Popen] = {}
+    self._lock = threading.Lock()
+    self._hooked = False
+
+  def is_active(self, key: str) -> bool:
+    process = self._processes.get(key)
+    return process is not None and process.poll() is None
+
+  def start(
+    self,
+    key: str,
+    kind: str,
+    name: str,
+    namespace: str,
+    local_port: int,
+    target_port: int,
+  ) -> bool:
+    """Starts forwarding `local_port` to the resource, unless already forwarding."""
+    with self._lock:
+      if self.is_active(key):
+        logger.warning("Port forwarding is already active for %s", key)
+        return True
+
+      self._processes[key] = kubectl.port_forward(
+        kind, name, namespace, local_port, target_port
+      )
+      if not self._hooked:
+        atexit.register(self.stop_all)
+        cleanup.register(lambda *_: self.stop_all())
+        self._hooked = True
+
+    return self.is_active(key)
+
+  def stop(self, key: str) -> bool:
+    """Stops forwarding for the resource, returning whether it was active."""
+    with self._lock:
+      process = self._processes.pop(key, None)
+    if process is None or process.poll() is not None:
+      return False
+
+    try:
+      logger.info("Terminating port forward process for %s", key)
+      process.terminate()
+    except OSError as e:
+      logger.warning("Error while terminating port forward process: %s", e)
+    return True
+
+  def stop_all(self):
+    for key in list(self._processes):
+      self.stop(key)
+
+
+port_forward_manager = PortForwardManager()
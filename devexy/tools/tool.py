@@ -1,23 +1,39 @@
+import contextlib
+import shutil
 import subprocess
-from typing import List
+import tempfile
+from collections.abc import Iterator
+from typing import IO, List
 
 from devexy.exceptions import ExecutableError, ToolError
 from devexy.utils import proc
 
 
+def _as_text(output: str | bytes | None) -> str | None:
+  if isinstance(output, bytes):
+    return output.decode("utf-8", errors="replace")
+  return output
+
+
 class Tool:
   exe = None
 
   def __init__(self, exe: str):
     self.exe = exe
 
+  @property
+  def is_installed(self) -> bool:
+    """Whether the executable can be found on `PATH`, without running it."""
+    return shutil.which(self.exe) is not None
+
   def exec(
     self,
     command: str,
     *command_args: List[str],
     input=None,
     raise_on_error=True,
-  ) -> str | None:
+    text=True,
+  ) -> str | bytes | None:
     """
     Run a command synchronously, returning its standard output.
 
@@ -26,6 +42,8 @@ class Tool:
       *command_args: Additional arguments for the command.
       raise_on_error: Whether to raise an exception if the command fails.
       input: text to pass to the executable.
+      text: Whether to return the output as text, rather than bytes. Errors always
+        carry their output as text.
 
     Returns:
       The standard output of the command as a string, or `None` if the command failed and `raise_on_error` is `False`.
@@ -38,12 +56,14 @@ class Tool:
     args.extend([str(x) for x in command_args])
 
     try:
-      result = proc.run(args, input)
+      result = proc.run(args, input, text=text)
       if result.returncode == 0:
         return result.stdout
       else:
         if raise_on_error:
-          raise ToolError(result.returncode, args, result.stdout, result.stderr)
+          raise ToolError(
+            result.returncode, args, _as_text(result.stdout), _as_text(result.stderr)
+          )
         else:
           return None
     except FileNotFoundError:
@@ -54,13 +74,52 @@ class Tool:
     command: str,
     *command_args,
     capture_output=False,
+    stderr=None,
   ):
-    """Run a non-blocking command."""
+    """Run a non-blocking command. `stderr` overrides where its stderr goes."""
     args = [self.exe, command]
     args.extend(command_args)
+    if stderr is None:
+      stderr = subprocess.PIPE if capture_output else subprocess.DEVNULL
+    # Unlike `exec`, the process may outlive most of what the parent has open, so
+    # make sure none of it is handed down
     return subprocess.Popen(
       args,
       stdout=subprocess.PIPE if capture_output else subprocess.DEVNULL,
-      stderr=subprocess.PIPE if capture_output else subprocess.DEVNULL,
+      stderr=stderr,
       text=True,
+      close_fds=True,
     )
+
+  @contextlib.contextmanager
+  def stream(self, command: str, *command_args) -> Iterator[IO[str]]:
+    """
+    Run a command, yielding its standard output as a text stream while it runs.
+
+    Raises:
+      ToolError: If the command returns a non-zero exit code.
+      ExecutableError: If the executable (`self.exe`) is not found.
+    """
+    args = [self.exe, command]
+    args.extend([str(x) for x in command_args])
+
+    # stderr goes to a file so a chatty command can't block on a full pipe
+    with tempfile.TemporaryFile(mode="w+", encoding="utf-8") as stderr:
+      try:
+        process = subprocess.Popen(
+          args,
+          stdout=subprocess.PIPE,
+          stderr=stderr,
+          text=True,
+          encoding="utf-8",
+          close_fds=True,
+        )
+      except FileNotFoundError:
+        raise ExecutableError(f"Executable '{self.exe}' not found.")
+
+      with process:
+        yield process.stdout
+
+      if process.returncode != 0:
+        stderr.seek(0)
+        raise ToolError(process.returncode, args, None, stderr.read())
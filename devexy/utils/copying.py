@@ -0,0 +1,10 @@
+def fast_dict_copy(value):
+  """Deep copies a structure of dicts and lists, such as a parsed manifest.
+  Other values are shared rather than copied, so they must be immutable. This skips
+  the memo and per-type dispatch of `copy.deepcopy`, making it several times faster.
+  """
+  if isinstance(value, dict):
+    return {k: fast_dict_copy(v) for k, v in value.items()}
+  if isinstance(value, list):
+    return [fast_dict_copy(v) for v in value]
+  return value
@@ -1,5 +1,8 @@
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 from devexy.settings import APP_DIR
 
@@ -8,6 +11,31 @@ LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 MAX_BYTES = 1024 * 1024 * 5  # 5MB
 BACKUP_COUNT = 5
 
+# Records are queued by the logging thread and written to the file by a listener
+# thread, so logging never waits on disk
+_log_queue = queue.SimpleQueue()
+# One handler is shared by every logger
+_queue_handler = QueueHandler(_log_queue)
+_listener: QueueListener = None
+_listener_lock = threading.Lock()
+
+
+def _start_listener():
+  global _listener
+  with _listener_lock:
+    if _listener is None:
+      LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
+      rotating_handler = RotatingFileHandler(
+        LOG_FILE,
+        maxBytes=MAX_BYTES,
+        backupCount=BACKUP_COUNT,
+      )
+      rotating_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+      _listener = QueueListener(_log_queue, rotating_handler)
+      _listener.start()
+      # Stopping flushes whatever is still queued
+      atexit.register(_listener.stop)
+
 
 def configure_logger(level):
   root_logger = logging.getLogger()
@@ -20,13 +48,8 @@ def get_logger(name):
   logger = logging.getLogger(name)
   logger.propagate = False
 
-  if not logger.handlers:
-    rotating_handler = RotatingFileHandler(
-      LOG_FILE,
-      maxBytes=MAX_BYTES,
-      backupCount=BACKUP_COUNT,
-    )
-    rotating_handler.setFormatter(logging.Formatter(LOG_FORMAT))
-    logger.addHandler(rotating_handler)
+  if _queue_handler not in logger.handlers:
+    _start_listener()
+    logger.addHandler(_queue_handler)
 
   return logger
@@ -1,3 +1,4 @@
+import shutil
 import subprocess
 from typing import List
 
@@ -8,25 +9,39 @@ logger = logging.get_logger(__name__)
 
 def run(
   args: List[str],
-  input: str = None,
+  input: str | bytes | None = None,
+  text: bool = True,
 ) -> subprocess.CompletedProcess:
   """
-  Lightweight wrapper around `subprocess.run`. Always captures output and treats i/o as text.
+  Lightweight wrapper around `subprocess.run`. Always captures output, as UTF-8 text
+  unless `text` is `False`.
 
   Args:
       args: The command to run and all its arguments, as a list of strings.
+      input: Data to pass to the command's stdin, str or bytes to match `text`.
+      text: Whether to decode the output. Raw bytes suit output that is only parsed,
+        such as JSON, as the parser can decode it in the same pass.
 
   Returns:
       A subprocess.CompletedProcess instance, with a nonzero `returncode` on failure.
   """
   args = [str(x) for x in args]
+  executable = shutil.which(args[0])
+  if executable is None:
+    raise FileNotFoundError(f"Executable '{args[0]}' not found.")
+
+  # With a resolved path and close_fds=False, subprocess uses posix_spawn instead
+  # of fork+exec. Python creates fds non-inheritable (PEP 446), and this is only
+  # used for commands that finish before returning; long-lived processes started
+  # by `Tool.start` and `Tool.stream` keep close_fds=True.
   result = subprocess.run(
     args,
+    executable=executable,
+    close_fds=False,
     input=input,
     capture_output=True,
-    text=True,
     check=False,
-    encoding="utf-8",
+    encoding="utf-8" if text else None,
   )
   logger.debug("%s returncode: %s", " ".join(args), result.returncode)
   return result
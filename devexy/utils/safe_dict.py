@@ -1,35 +1,23 @@
+import contextlib
 import threading
+from collections.abc import Iterator
 
 
 class SafeDict(dict):
-  def __init__(self, *args, **kwargs):
-    super().__init__(*args, **kwargs)
-    self._lock = threading.Lock()
-
-  def __setitem__(self, key, value):
-    with self._lock:
-      super().__setitem__(key, value)
-
-  def __delitem__(self, key):
-    with self._lock:
-      super().__delitem__(key)
-
-  def update(self, *args, **kwargs):
-    with self._lock:
-      super().update(*args, **kwargs)
-
-  def pop(self, key, default=None):
-    with self._lock:
-      return super().pop(key, default)
+  """
+  A dict that can be shared between threads.
 
-  def popitem(self):
-    with self._lock:
-      return super().popitem()
+  Single operations are already atomic under the GIL, so they aren't locked. Work
+  that must see a consistent dict, such as a check followed by a write, goes in a
+  `transaction()`, as do writes that may race with a transaction iterating it.
+  """
 
-  def clear(self):
-    with self._lock:
-      super().clear()
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self._lock = threading.RLock()
 
-  def setdefault(self, key, default=None):
+  @contextlib.contextmanager
+  def transaction(self) -> Iterator["SafeDict"]:
+    """Holds the lock for the duration of the block, yielding the dict itself."""
     with self._lock:
-      return super().setdefault(key, default)
+      yield self
@@ -1,11 +1,15 @@
 import hashlib
 
 
-def secure_hash(text: str) -> str:
-  """Calculates the SHA256 hash of the string."""
-  return hashlib.sha256(text.encode("utf-8")).hexdigest()
+def _to_bytes(data: str | bytes) -> bytes:
+  return data.encode("utf-8") if isinstance(data, str) else data
 
 
-def quick_hash(text: str) -> str:
-  """Calculates the SHA1 hash of the string."""
-  return hashlib.sha1(text.encode("utf-8")).hexdigest()
+def secure_hash(data: str | bytes) -> str:
+  """Calculates the 256-bit BLAKE2b hash of the string or bytes."""
+  return hashlib.blake2b(_to_bytes(data), digest_size=32).hexdigest()
+
+
+def quick_hash(data: str | bytes) -> str:
+  """Calculates a short (64-bit) BLAKE2b hash of the string or bytes."""
+  return hashlib.blake2b(_to_bytes(data), digest_size=8).hexdigest()
@@ -1,29 +1,33 @@
 #!/usr/bin/env python
 import random
 import threading
-import time
 
 from blessed import Terminal
 
 term = Terminal()
 headers = ["ID", "Value", "Status"]
+STATUSES = ("Active", "Inactive", "Pending")
+# DEC private mode 2026; terminals without it ignore these
+BEGIN_SYNC = "\x1b[?2026h"
+END_SYNC = "\x1b[?2026l"
 
 
 def generate_data():
   """Generate random data for the table"""
-  return [
-    [i, random.randint(1, 100), random.choice(["Active", "Inactive", "Pending"])]
-    for i in range(1, 6)
-  ]
+  return [[i, random.randint(1, 100), random.choice(STATUSES)] for i in range(1, 6)]
 
 
 running = True
+# Set whenever the data changes, so the table is only redrawn when needed
+dirty = threading.Event()
 
 
 def render_table(data):
   """Render the table efficiently in a separate thread"""
   global running
 
+  last_rendered = [None] * len(data)
+
   def render():
     with term.fullscreen(), term.cbreak(), term.hidden_cursor():
       print(term.home + term.clear)  # Clear screen once at the beginning
@@ -33,36 +37,57 @@ def render_table(data):
       print(term.bold(term.white("{:<5} {:<10} {:<10}".format(*headers))))
       print(term.bold("=" * 30))
 
+      dirty.set()  # Draw the first frame straight away
+      size = None
       while running:
+        # Check at least once a second anyway, e.g. for a terminal resize
+        dirty.wait(timeout=1.0)
+        dirty.clear()
+        if (term.width, term.height) != size:
+          # A resize can garble the screen, so draw every row again
+          size = (term.width, term.height)
+          last_rendered[:] = [None] * len(data)
+        frame = []
         for i, row in enumerate(data):
+          # Only rewrite rows whose text changed since they were last drawn
+          line = "{:<5} {:<10} {:<10}".format(*row)
+          if line == last_rendered[i]:
+            continue
+          last_rendered[i] = line
           # Move cursor to the correct line to update row instead of clearing screen
-          print(term.move_xy(0, 4 + i) + "{:<5} {:<10} {:<10}".format(*row))
+          frame.append(term.move_xy(0, 4 + i) + line)
         # Clear the footer line before re-rendering it
-        print(term.move_xy(0, term.height - 1) + term.clear_eol, end="")
+        frame.append(term.move_xy(0, term.height - 1) + term.clear_eol)
         # Render static footer pinned to the bottom of the terminal
-        print(
+        frame.append(
           term.move_xy(0, term.height - 1)
-          + term.bold(term.yellow("Press 'q' to quit.")),
-          end="",
-          flush=True,
+          + term.bold(term.yellow("Press 'q' to quit."))
         )
-        time.sleep(0.1)
+        # Terminals supporting synchronized output show the frame all at once
+        print(BEGIN_SYNC + "".join(frame) + END_SYNC, end="", flush=True)
 
   render_thread = threading.Thread(target=render, daemon=True)
 
   render_thread.start()
 
+  randint = random.randint
+  index = -1
   while running:
+    # Block until a key arrives, then drain whatever else is already buffered
+    # (e.g. a paste or key repeat) so the burst is drawn as a single frame
     key = term.inkey()
-    if key:
+    while key and running:
       if key == "q":
         print(term.home + term.clear)  # Clear screen before exiting
         print(term.center(term.bold("Exiting...")))
         running = False
-      # Update data in response to keypress
-      for row in data:
-        row[1] = random.randint(1, 100)
-        row[2] = random.choice(["Active", "Inactive", "Pending"])
+      # Update one row per keypress, taking turns
+      index = (index + 1) % len(data)
+      row = data[index]
+      row[1] = randint(1, 100)
+      row[2] = STATUSES[randint(0, len(STATUSES) - 1)]
+      key = term.inkey(timeout=0)
+    dirty.set()
 
   render_thread.join()
 
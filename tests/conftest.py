@@ -0,0 +1,13 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def no_kube_api(monkeypatch):
+  """Keep tests from talking to whatever cluster the local kubeconfig points at."""
+  monkeypatch.setattr("devexy.settings.KUBE_API", False)
+
+
+@pytest.fixture
+def proc_run(mocker):
+  """Replaces the subprocess runner behind every tool; set its return_value."""
+  return mocker.patch("devexy.utils.proc.run")
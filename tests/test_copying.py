@@ -0,0 +1,9 @@
+from devexy.utils.copying import fast_dict_copy
+
+
+def test_fast_dict_copy():
+  doc = {"spec": {"containers": [{"name": "app", "ports": [{"containerPort": 80}]}]}}
+  copied = fast_dict_copy(doc)
+  assert copied == doc
+  copied["spec"]["containers"][0]["ports"].append({"containerPort": 443})
+  assert doc["spec"]["containers"][0]["ports"] == [{"containerPort": 80}]
@@ -0,0 +1,34 @@
+import os
+import time
+
+import pytest
+
+from devexy.k8s import disco_cache
+from devexy.k8s.utils import clear_cache
+
+
+@pytest.fixture(autouse=True)
+def cache_root(tmp_path, monkeypatch):
+  monkeypatch.setattr("devexy.k8s.utils.STATE_CACHE_ROOT", tmp_path / "state")
+  monkeypatch.setattr("devexy.k8s.disco_cache.DISCO_CACHE_ROOT", tmp_path / "disco")
+  return tmp_path / "disco"
+
+
+def test_cache_file_creates_dir(cache_root):
+  path = disco_cache.cache_file("api", 600)
+  assert path.parent == cache_root
+  assert cache_root.is_dir()
+
+
+def test_cache_file_hits_after_clear_cache():
+  disco_cache.cache_file("api", 600).write_text('{"resources": {}}')
+  clear_cache()
+  assert disco_cache.cache_file("api", 600).read_text() == '{"resources": {}}'
+
+
+def test_cache_file_removes_expired_copy():
+  path = disco_cache.cache_file("api", 600)
+  path.write_text("{}")
+  stale = time.time() - 601
+  os.utime(path, (stale, stale))
+  assert not disco_cache.cache_file("api", 600).exists()
@@ -0,0 +1,38 @@
+from devexy.k8s.utils import clear_cache, get_last_applied_configuration
+
+LAST_APPLIED = "kubectl.kubernetes.io/last-applied-configuration"
+
+
+def _annotated(value):
+  return {"metadata": {"annotations": {LAST_APPLIED: value}}}
+
+
+def test_get_last_applied_configuration_json():
+  doc = _annotated('{"kind":"Deployment","spec":{"replicas":2}}\n')
+  assert get_last_applied_configuration(doc) == {
+    "kind": "Deployment",
+    "spec": {"replicas": 2},
+  }
+
+
+def test_get_last_applied_configuration_yaml():
+  doc = _annotated("kind: Deployment\nspec:\n  replicas: 2\n")
+  assert get_last_applied_configuration(doc) == {
+    "kind": "Deployment",
+    "spec": {"replicas": 2},
+  }
+
+
+def test_get_last_applied_configuration_missing():
+  assert get_last_applied_configuration({"metadata": {}}) is None
+
+
+def test_clear_cache(tmp_path, monkeypatch):
+  monkeypatch.setattr("devexy.k8s.utils.STATE_CACHE_ROOT", tmp_path / "cache")
+  (tmp_path / "cache" / "nested").mkdir(parents=True)
+  (tmp_path / "cache" / "nested" / "state.json").write_text("{}")
+  (tmp_path / "cache" / "state.json").write_text("{}")
+
+  clear_cache()
+
+  assert not (tmp_path / "cache").exists()
@@ -1,160 +1,127 @@
+import json
 from subprocess import CompletedProcess
 
 import pytest
-import yaml
+from kubernetes.client.exceptions import ApiException
 
+from devexy.exceptions import ToolError
 from devexy.tools.kubectl import kubectl
+from devexy.tools.kubectl_api import kubectl_api
 
+YAML_POD = "apiVersion: v1\nkind: Pod\nmetadata:\n  name: test-pod\n"
 
-def test_apply_success(mocker):
-  mocker.patch(
-    "devexy.utils.proc.run",
-    return_value=CompletedProcess(
-      args=["kubectl", "apply", "-f", "-"],
-      returncode=0,
-      stdout="resource applied",
-    ),
-  )
-  yaml_content = yaml.dump(
-    {
-      "apiVersion": "v1",
-      "kind": "Pod",
-      "metadata": {"name": "test-pod"},
-    }
+
+def test_apply_success(proc_run):
+  proc_run.return_value = CompletedProcess(
+    args=["kubectl", "apply", "-f", "-"],
+    returncode=0,
+    stdout="resource applied",
   )
-  result = kubectl.apply(yaml_content)
+  result = kubectl.apply(YAML_POD)
   assert result is True
 
 
-def test_apply_failure(mocker):
-  mocker.patch(
-    "devexy.utils.proc.run",
-    return_value=CompletedProcess(
-      args=["kubectl", "apply", "-f", "-"],
-      returncode=1,
-      stderr="failed to apply",
-    ),
+def test_apply_failure(proc_run):
+  proc_run.return_value = CompletedProcess(
+    args=["kubectl", "apply", "-f", "-"],
+    returncode=1,
+    stderr="failed to apply",
   )
-  yaml_content = yaml.dump(
-    {
-      "apiVersion": "v1",
-      "kind": "Pod",
-      "metadata": {"name": "test-pod"},
-    }
-  )
-  result = kubectl.apply(yaml_content)
-  assert result is False
+  with pytest.raises(ToolError):
+    kubectl.apply(YAML_POD)
 
 
-def test_create_namespace_if_not_exists_created(mocker):
-  mocker.patch(
-    "devexy.utils.proc.run",
-    return_value=CompletedProcess(
-      args=["kubectl", "create", "namespace", "test-ns"],
-      returncode=0,
-      stdout="namespace/test-ns created",
-    ),
+def test_create_namespace_if_not_exists_created(proc_run):
+  proc_run.return_value = CompletedProcess(
+    args=["kubectl", "create", "namespace", "test-ns"],
+    returncode=0,
+    stdout="namespace/test-ns created",
   )
   result = kubectl.create_namespace_if_not_exists("test-ns")
   assert result is True
 
 
-def test_create_namespace_if_not_exists_already_exists(mocker):
-  mocker.patch(
-    "devexy.utils.proc.run",
-    return_value=CompletedProcess(
-      args=["kubectl", "create", "namespace", "test-ns"],
-      returncode=1,
-      stderr="Error from server (AlreadyExists)",
-    ),
+def test_create_namespace_if_not_exists_already_exists(proc_run):
+  proc_run.return_value = CompletedProcess(
+    args=["kubectl", "create", "namespace", "test-ns"],
+    returncode=1,
+    stderr="Error from server (AlreadyExists)",
   )
   result = kubectl.create_namespace_if_not_exists("test-ns")
   assert result is False
 
 
-def test_resource_exists_yes(mocker):
-  mocker.patch(
-    "devexy.utils.proc.run",
-    return_value=CompletedProcess(
-      args=[
-        "kubectl",
-        "get",
-        "deployment",
-        "test-deploy",
-        "-o",
-        "name",
-        "-n",
-        "default",
-      ],
-      returncode=0,
-      stdout="deployment/test-deploy",
-    ),
+def test_resource_exists_yes(proc_run):
+  proc_run.return_value = CompletedProcess(
+    args=[
+      "kubectl",
+      "get",
+      "deployment",
+      "test-deploy",
+      "-o",
+      "name",
+      "-n",
+      "default",
+    ],
+    returncode=0,
+    stdout="deployment/test-deploy",
   )
   result = kubectl.resource_exists("deployment", "test-deploy")
   assert result is True
 
 
-def test_resource_exists_no(mocker):
-  mocker.patch(
-    "devexy.utils.proc.run",
-    return_value=CompletedProcess(
-      args=[
-        "kubectl",
-        "get",
-        "deployment",
-        "test-deploy",
-        "-o",
-        "name",
-        "-n",
-        "default",
-      ],
-      returncode=1,
-      stderr='Error from server (NotFound): deployments.apps "test-deploy" not found',
-    ),
+def test_resource_exists_no(proc_run):
+  proc_run.return_value = CompletedProcess(
+    args=[
+      "kubectl",
+      "get",
+      "deployment",
+      "test-deploy",
+      "-o",
+      "name",
+      "-n",
+      "default",
+    ],
+    returncode=1,
+    stderr='Error from server (NotFound): deployments.apps "test-deploy" not found',
   )
   result = kubectl.resource_exists("deployment", "test-deploy")
   assert result is False
 
 
-def test_resource_exists_failure(mocker):
-  mocker.patch(
-    "devexy.utils.proc.run",
-    return_value=CompletedProcess(
-      args=[
-        "kubectl",
-        "get",
-        "deployment",
-        "test-deploy",
-        "-o",
-        "name",
-        "-n",
-        "default",
-      ],
-      returncode=1,
-      stderr="Unexpected error",
-    ),
+def test_resource_exists_failure(proc_run):
+  proc_run.return_value = CompletedProcess(
+    args=[
+      "kubectl",
+      "get",
+      "deployment",
+      "test-deploy",
+      "-o",
+      "name",
+      "-n",
+      "default",
+    ],
+    returncode=1,
+    stderr="Unexpected error",
   )
   with pytest.raises(RuntimeError):
     kubectl.resource_exists("deployment", "test-deploy")
 
 
-def test_get_replicas_success(mocker):
-  mocker.patch(
-    "devexy.utils.proc.run",
-    return_value=CompletedProcess(
-      args=[
-        "kubectl",
-        "get",
-        "deployment",
-        "test-deploy",
-        "-n",
-        "default",
-        "-o",
-        "jsonpath='{.status.replicas}'",
-      ],
-      returncode=0,
-      stdout="3",
-    ),
+def test_get_replicas_success(proc_run):
+  proc_run.return_value = CompletedProcess(
+    args=[
+      "kubectl",
+      "get",
+      "deployment",
+      "test-deploy",
+      "-n",
+      "default",
+      "-o",
+      "json",
+    ],
+    returncode=0,
+    stdout=json.dumps({"kind": "Deployment", "spec": {"replicas": 3}}),
   )
   result = kubectl.get_replicas(
     "test-deploy",
@@ -164,23 +131,20 @@ def test_get_replicas_success(mocker):
   assert result == 3
 
 
-def test_get_replicas_not_found(mocker):
-  mocker.patch(
-    "devexy.utils.proc.run",
-    return_value=CompletedProcess(
-      args=[
-        "kubectl",
-        "get",
-        "deployment",
-        "test-deploy",
-        "-n",
-        "default",
-        "-o",
-        "jsonpath='{.status.replicas}'",
-      ],
-      returncode=1,
-      stderr='Error from server (NotFound): deployments.apps "test-deploy" not found',
-    ),
+def test_get_replicas_not_found(proc_run):
+  proc_run.return_value = CompletedProcess(
+    args=[
+      "kubectl",
+      "get",
+      "deployment",
+      "test-deploy",
+      "-n",
+      "default",
+      "-o",
+      "json",
+    ],
+    returncode=1,
+    stderr='Error from server (NotFound): deployments.apps "test-deploy" not found',
   )
   assert (
     kubectl.get_replicas(
@@ -192,23 +156,20 @@ def test_get_replicas_not_found(mocker):
   )
 
 
-def test_get_replicas_failure(mocker):
-  mocker.patch(
-    "devexy.utils.proc.run",
-    return_value=CompletedProcess(
-      args=[
-        "kubectl",
-        "get",
-        "deployment",
-        "test-deploy",
-        "-n",
-        "default",
-        "-o",
-        "jsonpath='{.status.replicas}'",
-      ],
-      returncode=1,
-      stderr="Unexpected error",
-    ),
+def test_get_replicas_failure(proc_run):
+  proc_run.return_value = CompletedProcess(
+    args=[
+      "kubectl",
+      "get",
+      "deployment",
+      "test-deploy",
+      "-n",
+      "default",
+      "-o",
+      "json",
+    ],
+    returncode=1,
+    stderr="Unexpected error",
   )
   with pytest.raises(RuntimeError):
     kubectl.get_replicas(
@@ -216,3 +177,115 @@ def test_get_replicas_failure(mocker):
       "deployment",
       "default",
     )
+
+
+def test_get_last_applied_docs(proc_run):
+  last_applied = {"kind": "Deployment", "metadata": {"name": "test-deploy"}}
+  proc_run.return_value = CompletedProcess(
+    args=[],
+    returncode=0,
+    stdout=json.dumps(
+      {
+        "items": [
+          {
+            "kind": "Deployment",
+            "metadata": {
+              "name": "test-deploy",
+              "namespace": "test-ns",
+              "annotations": {
+                "kubectl.kubernetes.io/last-applied-configuration": json.dumps(
+                  last_applied
+                )
+              },
+            },
+          },
+          {
+            "kind": "StatefulSet",
+            "metadata": {"name": "test-sts", "namespace": "test-ns"},
+          },
+        ]
+      }
+    ),
+  )
+  result = kubectl.get_last_applied_docs(["deployment", "statefulset"])
+  assert result == {
+    "test-ns/deployment/test-deploy": last_applied,
+    "test-ns/statefulset/test-sts": None,
+  }
+  args = proc_run.call_args.args[0]
+  assert "deployment,statefulset" in args
+  assert "--all-namespaces" in args
+
+
+def test_get_current_state_uses_api(mocker, proc_run):
+  doc = {"kind": "Deployment", "metadata": {"name": "test-deploy"}}
+  mocker.patch("devexy.settings.KUBE_API", True)
+  mocker.patch.object(kubectl_api, "_client", mocker.MagicMock())
+  get_state = mocker.patch.object(kubectl_api, "get_current_state", return_value=doc)
+  assert kubectl.get_current_state("Deployment", "test-deploy", "default") == doc
+  get_state.assert_called_once_with(
+    "Deployment", "test-deploy", "default", cached=False
+  )
+  proc_run.assert_not_called()
+
+
+def test_get_current_state_falls_back_to_kubectl(mocker, proc_run):
+  doc = {"kind": "Deployment", "metadata": {"name": "test-deploy"}}
+  mocker.patch("devexy.settings.KUBE_API", True)
+  mocker.patch.object(kubectl_api, "_client", mocker.MagicMock())
+  mocker.patch.object(
+    kubectl_api,
+    "get_current_state",
+    side_effect=ApiException(status=500, reason="boom"),
+  )
+  proc_run.return_value = CompletedProcess(
+    args=[], returncode=0, stdout=json.dumps(doc)
+  )
+  assert kubectl.get_current_state("Deployment", "test-deploy", "default") == doc
+
+
+def test_get_current_state_raises_unexpected_api_errors(mocker, proc_run):
+  mocker.patch("devexy.settings.KUBE_API", True)
+  mocker.patch.object(kubectl_api, "_client", mocker.MagicMock())
+  mocker.patch.object(kubectl_api, "get_current_state", side_effect=KeyError("bug"))
+  with pytest.raises(KeyError):
+    kubectl.get_current_state("Deployment", "test-deploy", "default")
+  proc_run.assert_not_called()
+
+
+def test_apply_many(proc_run):
+  proc_run.return_value = CompletedProcess(
+    args=["kubectl", "apply", "-f", "-"],
+    returncode=0,
+    stdout="namespace/test-ns unchanged\ndeployment.apps/test-deploy configured\n",
+  )
+  result = kubectl.apply_many(['{"kind": "Namespace"}', '{"kind": "Deployment"}'])
+  assert result == {"namespace/test-ns": False, "deployment.apps/test-deploy": True}
+  assert (
+    proc_run.call_args.args[1] == '{"kind": "Namespace"}\n---\n{"kind": "Deployment"}'
+  )
+
+
+def test_get_resource_docs_cached_uses_api(mocker, proc_run):
+  mocker.patch("devexy.settings.KUBE_API", True)
+  mocker.patch.object(kubectl_api, "_client", mocker.MagicMock())
+  get_docs = mocker.patch.object(
+    kubectl_api, "get_resource_docs", side_effect=lambda kind, *_, **__: [kind]
+  )
+  docs = kubectl.get_resource_docs(
+    "deployment,statefulset", namespace=None, cached=True
+  )
+  assert docs == ["deployment", "statefulset"]
+  get_docs.assert_called_with("statefulset", None, cached=True)
+  proc_run.assert_not_called()
+
+
+def test_get_current_state_reads_binary_output(proc_run):
+  proc_run.return_value = CompletedProcess(
+    args=[],
+    returncode=1,
+    stdout=b"",
+    stderr=b'Error from server (NotFound): deployments.apps "x" not found',
+  )
+  assert kubectl.get_current_state("deployment", "x", "default") is None
+  assert proc_run.call_args.kwargs["text"] is False
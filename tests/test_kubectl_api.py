@@ -0,0 +1,94 @@
+import pytest
+from kubernetes.dynamic.exceptions import ResourceNotFoundError
+
+from devexy.tools.kubectl_api import KubectlApi
+
+
+class _FakeResult:
+  def __init__(self, value):
+    self._value = value
+
+  def to_dict(self):
+    return self._value
+
+
+class _FakeApi:
+  group_version = "apps/v1"
+  kind = "Deployment"
+  singular_name = "deployment"
+
+  def __init__(self):
+    self.calls = []
+
+  def get(self, **kwargs):
+    self.calls.append(kwargs)
+    return _FakeResult({"items": [{"metadata": {"name": "test-deploy"}}]})
+
+
+class _FakeDiscoverer:
+  """Matches attributes exactly, like the client's discoverer."""
+
+  def __init__(self, api):
+    self._api = api
+    self.misses = 0
+
+  def get(self, **kwargs):
+    if all(getattr(self._api, k) == v for k, v in kwargs.items()):
+      return self._api
+    # The real discoverer redoes discovery before giving up
+    self.misses += 1
+    raise ResourceNotFoundError(f"No matches found for {kwargs}")
+
+
+@pytest.fixture
+def api():
+  return _FakeApi()
+
+
+@pytest.fixture
+def discoverer(api):
+  return _FakeDiscoverer(api)
+
+
+@pytest.fixture
+def kubectl_api(discoverer):
+  instance = KubectlApi()
+  instance._client = type("_FakeClient", (), {"resources": discoverer})()
+  return instance
+
+
+@pytest.mark.parametrize("kind", ["deployment", "Deployment"])
+def test_get_resource_docs_finds_kind(kind, kubectl_api, discoverer, api):
+  docs = kubectl_api.get_resource_docs(kind, None, cached=True)
+  assert docs == [
+    {
+      "apiVersion": "apps/v1",
+      "kind": "Deployment",
+      "metadata": {"name": "test-deploy"},
+    }
+  ]
+  assert api.calls == [{"namespace": None, "resource_version": "0"}]
+  assert discoverer.misses == 0
+
+
+def test_get_resource_docs_looks_up_unknown_names_by_singular_name(
+  kubectl_api, discoverer, api, mocker
+):
+  mocker.patch.dict("devexy.tools.kubectl_api._KINDS", clear=True)
+  kubectl_api.get_resource_docs("deployment", "default")
+  assert api.calls == [{"namespace": "default"}]
+  assert discoverer.misses == 0
+
+
+def test_client_caches_discovery(tmp_path, mocker):
+  mocker.patch("devexy.k8s.disco_cache.DISCO_CACHE_ROOT", tmp_path)
+  api_client = mocker.patch("kubernetes.config.new_client_from_config").return_value
+  api_client.configuration.host = "https://127.0.0.1:6443"
+  dynamic_client = mocker.patch("kubernetes.dynamic.DynamicClient")
+
+  assert KubectlApi().client is dynamic_client.return_value
+  cache_file = dynamic_client.call_args.kwargs["cache_file"]
+  assert cache_file.startswith(str(tmp_path))
+  # Every invocation against the same cluster shares the cache
+  KubectlApi().client
+  assert dynamic_client.call_args.kwargs["cache_file"] == cache_file
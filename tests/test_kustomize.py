@@ -0,0 +1,125 @@
+import contextlib
+import io
+from subprocess import CompletedProcess
+
+import pytest
+
+from devexy.exceptions import ExecutableError, ToolError
+from devexy.tools import kustomize as kustomize_module
+from devexy.tools.kustomize import kustomize
+from devexy.tools.tool import Tool
+
+BUILD_OUTPUT = "apiVersion: v1\nkind: Namespace\nmetadata:\n  name: test-ns\n"
+
+
+@pytest.fixture
+def kustomize_root(tmp_path, monkeypatch):
+  root = tmp_path / "k8s"
+  overlay = root / "overlays" / "local"
+  overlay.mkdir(parents=True)
+  (overlay / "kustomization.yaml").write_text("resources: []\n")
+  monkeypatch.setattr("devexy.tools.kustomize.KUSTOMIZE_ROOT", root)
+  monkeypatch.setattr("devexy.tools.kustomize.BUILD_CACHE_ROOT", tmp_path / "cache")
+  return root
+
+
+def test_build_cached_reuses_output(proc_run, kustomize_root):
+  proc_run.return_value = CompletedProcess(args=[], returncode=0, stdout=BUILD_OUTPUT)
+  overlay = kustomize_root / "overlays" / "local"
+  assert kustomize.build_cached(overlay) == BUILD_OUTPUT
+  assert kustomize.build_cached(overlay) == BUILD_OUTPUT
+  assert proc_run.call_count == 1
+
+
+def test_build_cached_rebuilds_when_root_changes(proc_run, kustomize_root):
+  proc_run.return_value = CompletedProcess(args=[], returncode=0, stdout=BUILD_OUTPUT)
+  overlay = kustomize_root / "overlays" / "local"
+  kustomize.build_cached(overlay)
+  (kustomize_root / "base.yaml").write_text("kind: ConfigMap\n")
+  kustomize.build_cached(overlay)
+  assert proc_run.call_count == 2
+
+
+def test_build_cached_disabled(mocker, proc_run, kustomize_root):
+  mocker.patch("devexy.settings.KUSTOMIZE_CACHE", False)
+  proc_run.return_value = CompletedProcess(args=[], returncode=0, stdout=BUILD_OUTPUT)
+  overlay = kustomize_root / "overlays" / "local"
+  kustomize.build_cached(overlay)
+  kustomize.build_cached(overlay)
+  assert proc_run.call_count == 2
+
+
+@pytest.fixture
+def build_stream(mocker):
+  """Feeds kustomize's output to the parser as a stream; set its `output`."""
+  build_stream = mocker.patch.object(
+    kustomize,
+    "build_stream",
+    side_effect=lambda path: contextlib.nullcontext(io.StringIO(build_stream.output)),
+  )
+  build_stream.output = BUILD_OUTPUT
+  return build_stream
+
+
+def test_build_docs_uses_json_sidecar(mocker, proc_run, build_stream, kustomize_root):
+  yaml_to_dicts = mocker.spy(kustomize_module, "yaml_to_dicts")
+  overlay = kustomize_root / "overlays" / "local"
+  expected = [
+    {"apiVersion": "v1", "kind": "Namespace", "metadata": {"name": "test-ns"}}
+  ]
+  assert kustomize.build_docs(overlay) == expected
+  assert kustomize.build_docs(overlay) == expected
+  assert build_stream.call_count == 1
+  assert yaml_to_dicts.call_count == 1
+  proc_run.assert_not_called()
+
+
+def test_build_docs_caches_streamed_output(proc_run, build_stream, kustomize_root):
+  overlay = kustomize_root / "overlays" / "local"
+  kustomize.build_docs(overlay)
+  assert kustomize.build_cached(overlay) == BUILD_OUTPUT
+  proc_run.assert_not_called()
+
+
+def test_build_docs_falls_back_to_yaml_cache(proc_run, build_stream, kustomize_root):
+  # Timestamps can't be stored as JSON
+  build_stream.output = BUILD_OUTPUT + "data:\n  created: 2024-01-01\n"
+  overlay = kustomize_root / "overlays" / "local"
+  docs = kustomize.build_docs(overlay)
+  assert kustomize.build_docs(overlay) == docs
+  assert build_stream.call_count == 1
+  proc_run.assert_not_called()
+
+
+def test_build_docs_streams_when_cache_disabled(
+  mocker, proc_run, build_stream, kustomize_root
+):
+  mocker.patch("devexy.settings.KUSTOMIZE_CACHE", False)
+  overlay = kustomize_root / "overlays" / "local"
+  assert kustomize.build_docs(overlay)[0]["kind"] == "Namespace"
+  kustomize.build_docs(overlay)
+  assert build_stream.call_count == 2
+  proc_run.assert_not_called()
+
+
+def test_stream_raises_on_failure(tmp_path):
+  with pytest.raises(ToolError), Tool("false").stream("build", tmp_path) as stream:
+    stream.read()
+
+
+def test_stream_missing_executable(tmp_path):
+  with (
+    pytest.raises(ExecutableError),
+    Tool("devexy-no-such-tool").stream("build", tmp_path),
+  ):
+    pass
+
+
+def test_build_cached_prunes_stale_builds(proc_run, kustomize_root, tmp_path):
+  proc_run.return_value = CompletedProcess(args=[], returncode=0, stdout=BUILD_OUTPUT)
+  overlay = kustomize_root / "overlays" / "local"
+  kustomize.build_cached(overlay)
+  (kustomize_root / "base.yaml").write_text("kind: ConfigMap\n")
+  kustomize.build_cached(overlay)
+  cached = list((tmp_path / "cache").rglob("*.yaml"))
+  assert len(cached) == 1
@@ -0,0 +1,11 @@
+import pytest
+from typer.testing import CliRunner
+
+from devexy.main import app
+
+
+@pytest.mark.parametrize("command", ["mk", "logs"])
+def test_subcommands_omit_completion_options(command):
+  result = CliRunner().invoke(app, [command, "--help"])
+  assert result.exit_code == 0
+  assert "--install-completion" not in result.output
@@ -0,0 +1,27 @@
+from devexy.tools.port_forward_manager import PortForwardManager
+
+
+def test_start_and_stop(mocker):
+  process = mocker.MagicMock()
+  process.poll.return_value = None
+  port_forward = mocker.patch(
+    "devexy.tools.port_forward_manager.kubectl.port_forward", return_value=process
+  )
+  mocker.patch("devexy.tools.port_forward_manager.atexit")
+  cleanup = mocker.patch("devexy.tools.port_forward_manager.cleanup")
+  manager = PortForwardManager()
+
+  assert manager.start(
+    "default/deployment/web", "Deployment", "web", "default", 8080, 80
+  )
+  assert manager.start(
+    "default/deployment/web", "Deployment", "web", "default", 8080, 80
+  )
+  port_forward.assert_called_once_with("Deployment", "web", "default", 8080, 80)
+  assert manager.is_active("default/deployment/web")
+  cleanup.register.assert_called_once()
+
+  assert manager.stop("default/deployment/web")
+  process.terminate.assert_called_once()
+  assert not manager.is_active("default/deployment/web")
+  assert not manager.stop("default/deployment/web")
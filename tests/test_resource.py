@@ -1,16 +1,35 @@
-import copy
 import json
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import pytest
 
-from devexy.k8s.models.resource import Resource
-from devexy.k8s.utils import STATE_CACHE_ROOT
+from devexy.exceptions import ToolError
+from devexy.k8s.models.resource import FORWARDING_POLL_INTERVAL, Resource
+from devexy.k8s.state_store import StateStore
+from devexy.k8s.utils import get_key
 from devexy.utils.text import quick_hash
 
 
+class _NoopThread:
+  def __init__(self, *args, **kwargs):
+    pass
+
+  def start(self):
+    pass
+
+  def join(self, *args, **kwargs):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def _no_threads(monkeypatch):
+  """Cheaper than patching with a MagicMock around every construction."""
+  monkeypatch.setattr("threading.Thread", _NoopThread)
+
+
 # Do not use this directly as it will hit the live cache when turned into a Resource
-@pytest.fixture
+# Shared by the whole module, so tests must not mutate these docs
+@pytest.fixture(scope="module")
 def test_doc():
   return {
     "apiVersion": "apps/v1",
@@ -37,7 +56,7 @@ def test_doc():
   }
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def pod_doc():
   return {
     "apiVersion": "v1",
@@ -55,7 +74,7 @@ def pod_doc():
   }
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def service_doc():
   return {
     "apiVersion": "v1",
@@ -68,7 +87,7 @@ def service_doc():
   }
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def no_ports_doc():
   return {
     "apiVersion": "v1",
@@ -79,23 +98,29 @@ def no_ports_doc():
 
 
 @pytest.fixture
-def resource_instance_factory(tmp_path):
-  original_cache_root = STATE_CACHE_ROOT
-  # Use monkeypatch from pytest to temporarily change the constant
-  mpatch = pytest.MonkeyPatch()
-  mpatch.setattr("devexy.k8s.utils.STATE_CACHE_ROOT", tmp_path)
-  mpatch.setattr("devexy.k8s.models.resource.STATE_CACHE_ROOT", tmp_path)
+def state_store(monkeypatch):
+  # A fresh store, so nothing loaded by an earlier test leaks in
+  store = StateStore()
+  monkeypatch.setattr("devexy.k8s.state_store.atexit", MagicMock())
+  monkeypatch.setattr("devexy.k8s.state_store.cleanup", MagicMock())
+  monkeypatch.setattr("devexy.k8s.models.resource.state_store", store)
+  return store
 
-  def _factory(doc):
-    with patch("threading.Thread") as mock_thread:
-      resource = Resource(doc)
-      return resource
 
-  yield _factory
+@pytest.fixture
+def resource_instance_factory(tmp_path, monkeypatch, state_store):
+  monkeypatch.setattr("devexy.k8s.utils.STATE_CACHE_ROOT", tmp_path)
+
+  # Keyed by identity; each resource keeps its doc alive, so ids aren't reused
+  resources = {}
 
-  # Restore original cache root after test
-  mpatch.setattr("devexy.k8s.utils.STATE_CACHE_ROOT", original_cache_root)
-  mpatch.setattr("devexy.k8s.models.resource.STATE_CACHE_ROOT", original_cache_root)
+  def _factory(doc):
+    resource = resources.get(id(doc))
+    if resource is None:
+      resources[id(doc)] = resource = Resource(doc)
+    return resource
+
+  return _factory
 
 
 @pytest.fixture
@@ -104,76 +129,99 @@ def resource(resource_instance_factory, test_doc):
 
 
 @pytest.fixture
-def cache_file_path(resource, tmp_path):
-  filename = resource._k8s_state_file_name
-  return tmp_path / filename
+def cache_file_path(tmp_path):
+  return tmp_path / "state.json"
+
 
+def _saved_state(state_store, resource):
+  # Saving happens in the background, so write out anything pending first
+  state_store.flush()
+  return json.loads(state_store.path.read_text())[resource.key_hash]
 
-def test_resource_applied_when_hash_changes(test_doc):
-  # TODO mock apply, make sure it is called
-  doc1 = copy.deepcopy(test_doc)
-  doc1["spec"]["replicas"] = 0
-  with patch("threading.Thread"):
-    resource1 = Resource(doc1)
 
-  doc2 = copy.deepcopy(test_doc)
-  doc2["spec"]["replicas"] = 1
-  with patch("threading.Thread"):
-    resource2 = Resource(doc2)
+def test_resource_hash_generation(resource_instance_factory, test_doc):
+  doc1 = {**test_doc, "spec": {**test_doc["spec"], "replicas": 0}}
+  resource1 = resource_instance_factory(doc1)
 
-  assert quick_hash(resource1.yaml) != quick_hash(resource2.yaml)
+  doc2 = {**test_doc, "spec": {**test_doc["spec"], "replicas": 1}}
+  resource2 = resource_instance_factory(doc2)
 
+  assert resource1.state_hash == quick_hash(resource1.yaml)
+  assert resource1.state_hash != resource2.state_hash
 
-def test_cache_file_path_generation(resource, cache_file_path):
-  assert str(resource._k8s_state_file_path) == str(cache_file_path)
-  assert str(cache_file_path).endswith(".json")
-  assert quick_hash(resource.key) in str(cache_file_path)
+
+def test_state_saved_under_key_hash(resource, state_store):
+  resource._dump_k8s_state()
+  assert resource.key_hash == quick_hash(resource.key)
+  assert _saved_state(state_store, resource)["key"] == resource.key
 
 
 def test_load_k8s_state_when_file_does_not_exist(resource, cache_file_path):
   assert not cache_file_path.exists()
-  assert resource._k8s_state == {}
+  assert resource._k8s_state == {"key": resource.key}
   loaded_state = resource._load_k8s_state()
   assert loaded_state == {}
 
 
-def test_load_k8s_state_with_empty_file(resource, cache_file_path):
+def test_k8s_state_loaded_on_first_use(resource_instance_factory, test_doc):
+  with patch.object(Resource, "_load_k8s_state", return_value={}) as load:
+    resource = resource_instance_factory(test_doc)
+    load.assert_not_called()
+    assert resource._k8s_state == {"key": resource.key}
+    assert resource._k8s_state == {"key": resource.key}
+    load.assert_called_once()
+
+
+def test_load_k8s_state_with_empty_file(
+  resource_instance_factory, test_doc, cache_file_path
+):
   cache_file_path.touch()
   assert cache_file_path.exists()
-  with patch("threading.Thread"):
-    resource = Resource(resource._doc)
-  assert resource._k8s_state == {}
+  resource = resource_instance_factory(test_doc)
+  assert resource._k8s_state == {"key": resource.key}
 
 
-def test_load_k8s_state_invalid_json(resource, cache_file_path):
+def test_load_k8s_state_invalid_json(
+  resource_instance_factory, test_doc, cache_file_path
+):
   cache_file_path.write_text("this is not json")
   assert cache_file_path.exists()
-  with patch("threading.Thread"):
-    resource = Resource(resource._doc)
-  assert resource._k8s_state == {}
+  resource = resource_instance_factory(test_doc)
+  assert resource._k8s_state == {"key": resource.key}
 
 
-def test_load_k8s_state_valid_json(resource, cache_file_path):
+def test_load_k8s_state_valid_json(
+  resource_instance_factory, test_doc, cache_file_path
+):
   expected_state = {"last_applied_hash": "somehash123", "replicas": 5}
-  cache_file_path.write_text(json.dumps(expected_state))
+  key_hash = quick_hash(get_key(test_doc))
+  cache_file_path.write_text(json.dumps({key_hash: expected_state}))
   assert cache_file_path.exists()
-  with patch("threading.Thread"):
-    resource = Resource(resource._doc)
-  assert resource._k8s_state == expected_state
+  resource = resource_instance_factory(test_doc)
+  assert resource._k8s_state == {**expected_state, "key": resource.key}
 
 
-def test_dump_k8s_state(resource, cache_file_path):
+def test_dump_k8s_state(resource, state_store):
   test_state = {"foo": "bar", "count": 10}
   resource._k8s_state = test_state
   resource._dump_k8s_state()
-  assert cache_file_path.exists()
-  with open(cache_file_path, "r") as f:
-    saved_state = json.load(f)
-  assert saved_state == test_state
+  assert _saved_state(state_store, resource) == test_state
+
+
+def test_dump_k8s_state_skips_unchanged(resource, state_store):
+  resource._k8s_state = {"foo": "bar"}
+  resource._dump_k8s_state()
+  with patch.object(state_store, "put") as mock_put:
+    resource._dump_k8s_state()
+    mock_put.assert_not_called()
+
+    resource._k8s_state["foo"] = "baz"
+    resource._dump_k8s_state()
+    mock_put.assert_called_once()
 
 
 @patch("devexy.k8s.models.resource.kubectl")
-def test_apply_updates_cache_on_change_success(mock_kubectl, resource, cache_file_path):
+def test_apply_updates_cache_on_change_success(mock_kubectl, resource, state_store):
   mock_kubectl.apply.return_value = True
   resource._k8s_state = {}
 
@@ -186,19 +234,18 @@ def test_apply_updates_cache_on_change_success(mock_kubectl, resource, cache_fil
   mock_kubectl.apply.assert_called_once_with(resource.yaml)
   assert resource._k8s_state.get("last_applied_hash") == current_hash
 
-  assert cache_file_path.exists()
-  with open(cache_file_path, "r") as f:
-    saved_state = json.load(f)
+  saved_state = _saved_state(state_store, resource)
   assert saved_state.get("last_applied_hash") == current_hash
 
 
 @patch("devexy.k8s.models.resource.kubectl")
 def test_apply_does_not_update_cache_on_no_change(
-  mock_kubectl, resource, cache_file_path
+  mock_kubectl, resource, state_store, cache_file_path
 ):
   current_hash = quick_hash(resource.yaml)
   resource._k8s_state = {"last_applied_hash": current_hash}
   resource._dump_k8s_state()
+  state_store.flush()
 
   initial_mtime = cache_file_path.stat().st_mtime
 
@@ -208,15 +255,14 @@ def test_apply_does_not_update_cache_on_no_change(
   mock_kubectl.apply.assert_not_called()
   assert resource._k8s_state.get("last_applied_hash") == current_hash
 
+  state_store.flush()
   assert cache_file_path.stat().st_mtime == initial_mtime
 
 
 @patch("devexy.k8s.models.resource.kubectl")
-def test_apply_does_not_update_cache_on_failure(
-  mock_kubectl, resource, cache_file_path
-):
+def test_apply_does_not_update_cache_on_failure(mock_kubectl, resource, state_store):
   """Test that apply does not update cache if kubectl apply fails."""
-  mock_kubectl.apply.return_value = False
+  mock_kubectl.apply.side_effect = ToolError(1, ["kubectl", "apply"], stderr="boom")
   initial_hash = "oldhash123"
   resource._k8s_state = {"last_applied_hash": initial_hash}
   resource._dump_k8s_state()
@@ -227,29 +273,64 @@ def test_apply_does_not_update_cache_on_failure(
   mock_kubectl.apply.assert_called_once()
   assert resource._k8s_state.get("last_applied_hash") == initial_hash
 
-  with open(cache_file_path, "r") as f:
-    saved_state = json.load(f)
+  saved_state = _saved_state(state_store, resource)
   assert saved_state.get("last_applied_hash") == initial_hash
 
 
-def test_infer_target_port_deployment(resource_instance_factory, test_doc):
-  resource = resource_instance_factory(test_doc)
-  assert resource._infer_target_port() == 80
+@patch("devexy.k8s.models.resource.kubectl")
+def test_apply_updates_cache_when_unchanged(mock_kubectl, resource):
+  """kubectl reporting the resource unchanged means the cluster has this content."""
+  mock_kubectl.apply.return_value = False
+  resource._k8s_state = {"last_applied_hash": "oldhash123"}
+
+  assert resource.apply() is False
+  assert resource._k8s_state.get("last_applied_hash") == resource.state_hash
+
+
+@pytest.mark.parametrize(
+  "doc_fixture,expected",
+  [
+    ("test_doc", 80),
+    ("pod_doc", 8080),
+    ("service_doc", 80),
+    ("no_ports_doc", None),
+  ],
+)
+def test_infer_target_port(doc_fixture, expected, request, resource_instance_factory):
+  resource = resource_instance_factory(request.getfixturevalue(doc_fixture))
+  assert resource._infer_target_port() == expected
 
 
-def test_infer_target_port_pod(resource_instance_factory, pod_doc):
-  resource = resource_instance_factory(pod_doc)
-  assert resource._infer_target_port() == 8080
+def test_apply_observed_state_saves_only_changes(resource, state_store):
+  observed = {**resource._doc, "status": {"readyReplicas": 1}}
+  with patch.object(state_store, "put") as mock_put:
+    resource._apply_observed_state(observed)
+    resource._apply_observed_state({**observed, "status": {"readyReplicas": 1}})
+    mock_put.assert_called_once()
 
+    resource._apply_observed_state({**observed, "status": {"readyReplicas": 2}})
+    assert mock_put.call_count == 2
 
-def test_infer_target_port_service(resource_instance_factory, service_doc):
-  resource = resource_instance_factory(service_doc)
-  assert resource._infer_target_port() == 80
 
+def test_apply_name(resource_instance_factory, test_doc, service_doc):
+  assert resource_instance_factory(test_doc).apply_name == "deployment.apps/test-deploy"
+  assert resource_instance_factory(service_doc).apply_name == "service/test-svc"
 
-def test_infer_target_port_no_ports(resource_instance_factory, no_ports_doc):
-  resource = resource_instance_factory(no_ports_doc)
-  assert resource._infer_target_port() is None
+
+def test_mark_applied(resource):
+  resource.mark_applied()
+  assert resource._k8s_state["last_applied_hash"] == resource.state_hash
+
+
+def test_infer_target_port_cached_until_doc_changes(resource):
+  with patch.object(resource, "_find_target_port", return_value=8080) as find:
+    assert resource._infer_target_port() == 8080
+    assert resource._infer_target_port() == 8080
+    find.assert_called_once()
+
+    resource.set_replicas(3)
+    resource._infer_target_port()
+    assert find.call_count == 2
 
 
 def test_get_local_port(resource: Resource):
@@ -261,3 +342,38 @@ def test_reverse_proxy_yaml_generation(mock_kubectl_apply, resource: Resource):
   resource.toggle_forwarding_mode()
   assert mock_kubectl_apply.call_count == 3
   assert resource.is_proxying
+
+
+@patch("devexy.k8s.models.resource.port_forward_manager")
+def test_is_forwarding_polls_at_most_every_interval(mock_manager, resource):
+  mock_manager.is_active.return_value = True
+  assert resource.is_forwarding
+  assert resource.is_forwarding
+  mock_manager.is_active.assert_called_once_with(resource.key)
+
+  resource._forwarding_polled_at -= FORWARDING_POLL_INTERVAL
+  mock_manager.is_active.return_value = False
+  assert not resource.is_forwarding
+
+
+def test_yaml_cached_until_doc_changes(resource):
+  with patch("devexy.k8s.models.resource.dict_to_yaml", return_value="a") as mock_dump:
+    assert resource.yaml == "a"
+    assert resource.yaml == "a"
+    mock_dump.assert_called_once()
+
+    hash_a = resource.state_hash
+    resource.set_replicas(3)
+    mock_dump.return_value = "b"
+    assert resource.yaml == "b"
+    assert resource.state_hash != hash_a
+
+
+def test_matches_last_applied(resource):
+  with patch("devexy.k8s.models.resource.parse_last_applied_configuration") as parse:
+    assert resource.matches_last_applied(resource.yaml + "\n")
+    parse.assert_not_called()
+
+  # Text that differs only in formatting still matches once parsed
+  assert resource.matches_last_applied(json.dumps(resource._doc, indent=2))
+  assert not resource.matches_last_applied(json.dumps({"kind": "Deployment"}))
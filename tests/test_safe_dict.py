@@ -0,0 +1,27 @@
+import threading
+
+from devexy.utils.safe_dict import SafeDict
+
+
+def test_transaction_excludes_other_threads():
+  d = SafeDict(count=0)
+
+  def _increment():
+    for _ in range(1000):
+      with d.transaction() as raw:
+        raw["count"] = raw["count"] + 1
+
+  threads = [threading.Thread(target=_increment) for _ in range(4)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert d["count"] == 4000
+
+
+def test_transaction_is_reentrant():
+  d = SafeDict()
+  with d.transaction() as outer:
+    with d.transaction() as inner:
+      inner["a"] = 1
+    assert outer == {"a": 1}
@@ -0,0 +1,66 @@
+import json
+import time
+
+import pytest
+
+from devexy.k8s.state_store import StateStore
+from devexy.k8s.utils import clear_cache
+
+
+@pytest.fixture(autouse=True)
+def no_exit_hooks(mocker):
+  mocker.patch("devexy.k8s.state_store.atexit")
+  mocker.patch("devexy.k8s.state_store.cleanup")
+
+
+@pytest.fixture
+def cache_root(tmp_path, monkeypatch):
+  root = tmp_path / "missing"
+  monkeypatch.setattr("devexy.k8s.utils.STATE_CACHE_ROOT", root)
+  return root
+
+
+def test_put_creates_cache_dir(cache_root):
+  store = StateStore()
+  store.put("a", {"replicas": 1})
+  store.flush()
+  assert json.loads((cache_root / "state.json").read_text()) == {"a": {"replicas": 1}}
+
+
+def test_states_share_one_file(cache_root):
+  store = StateStore()
+  store.put("a", {"replicas": 1})
+  store.put("b", {"replicas": 2})
+  store.flush()
+
+  reloaded = StateStore()
+  assert reloaded.get("a") == {"replicas": 1}
+  assert reloaded.get("b") == {"replicas": 2}
+  assert reloaded.get("c") == {}
+
+
+def test_get_ignores_unreadable_file(cache_root):
+  cache_root.mkdir()
+  (cache_root / "state.json").write_text("this is not json")
+  assert StateStore().get("a") == {}
+
+
+def test_put_saves_in_background(cache_root, mocker):
+  mocker.patch("devexy.k8s.state_store.FLUSH_DELAY", 0)
+  StateStore().put("a", {"replicas": 1})
+  deadline = time.monotonic() + 1
+  while not (cache_root / "state.json").exists() and time.monotonic() < deadline:
+    time.sleep(0.01)
+  assert StateStore().get("a") == {"replicas": 1}
+
+
+def test_clear_cache_forgets_loaded_states(cache_root, mocker):
+  store = mocker.patch("devexy.k8s.state_store.state_store", StateStore())
+  store.put("a", {"last_applied_hash": "old"})
+  store.flush()
+
+  clear_cache()
+  store.put("b", {"replicas": 1})
+  store.flush()
+
+  assert json.loads((cache_root / "state.json").read_text()) == {"b": {"replicas": 1}}
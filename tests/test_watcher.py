@@ -0,0 +1,32 @@
+import io
+import json
+
+from devexy.k8s.watcher import StateWatcher, _iter_json_docs
+
+
+def _doc(name, replicas):
+  return {
+    "kind": "Deployment",
+    "metadata": {"name": name, "namespace": "default"},
+    "status": {"readyReplicas": replicas},
+  }
+
+
+def test_iter_json_docs():
+  docs = [_doc("web", 1), _doc("web", 2)]
+  stream = io.StringIO("".join(json.dumps(d, indent=4) + "\n" for d in docs))
+  assert list(_iter_json_docs(stream)) == docs
+
+
+def test_dispatch_to_registered_resource(mocker):
+  mocker.patch("threading.Thread")
+  resource = mocker.MagicMock(key="default/deployment/web", kind="Deployment")
+  resource.namespace = "default"
+  watcher = StateWatcher()
+  watcher.register(resource)
+
+  watcher._dispatch(_doc("web", 1))
+  watcher._dispatch(_doc("api", 1))
+
+  resource._apply_observed_state.assert_called_once_with(_doc("web", 1))
+  assert watcher.is_watching(resource)
@@ -0,0 +1,25 @@
+from devexy.commands.workon import _apply_batches
+from devexy.k8s.models.resource import Resource
+
+
+def _deployment(namespace: str) -> Resource:
+  return Resource(
+    {
+      "apiVersion": "apps/v1",
+      "kind": "Deployment",
+      "metadata": {"name": "web", "namespace": namespace},
+    }
+  )
+
+
+def test_apply_batches_keeps_namespaces_apart(mocker):
+  mark_applied = mocker.patch.object(Resource, "mark_applied")
+  apply_many = mocker.patch(
+    "devexy.commands.workon.kubectl.apply_many",
+    side_effect=[{"deployment.apps/web": True}, {}],
+  )
+  resources = [_deployment("one"), _deployment("two")]
+
+  assert _apply_batches(resources, jobs=1) == [True, None]
+  assert apply_many.call_count == 2
+  mark_applied.assert_called_once()